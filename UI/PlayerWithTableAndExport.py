@@ -1,10 +1,28 @@
-import vlc
 import PySimpleGUI as sg
 from sys import platform as PLATFORM
-from os import listdir
-import json
 import os
 import sys
+import time
+import argparse
+import threading
+import traceback
+
+from buttonImages import ButtonImages
+from encodingStore import open_cached_store
+from effectJournal import JOURNAL_DIRNAME, EffectJournal, replay
+from effectRegistry import CONFIG_FILENAME as EFFECTS_FILENAME, REGISTRY
+from effectDispatcher import EffectDispatcher, SocketOutput, StdoutOutput
+from effectTimeline import EffectTimeline
+from displayState import TrackDisplay
+from effectsTable import EffectsTableModel
+from exportWriter import ExportWriter
+from hotkeyCapture import HotkeyCapture
+from hotReload import (EVENT_KEY as HOT_RELOAD, listen, quarantine_state, read_state, remove_state, state_path,
+                       write_state)
+from playbackClock import PlaybackClock
+from trackIdentity import CACHE_FILENAME, TrackIdentity
+from trackSession import TrackSession
+from vlcInstance import get_instance
 
 if getattr(sys, 'frozen', False):
     # If the application is run as a bundle, the PyInstaller bootloader
@@ -17,33 +35,120 @@ else:
 PATH = os.path.join(base_path, "./Assets/")
 
 # PATH = './Assets/'
-BUTTON_DICT = {img[:-4].upper(): PATH + img for img in listdir(PATH)}
+BUTTON_IMAGES = ButtonImages(PATH)  # Read once, decoded once and shared by every window
 ICON = PATH + 'player.ico'
 
+WAVEFORM_HEIGHT = 60  # Height in pixels of the waveform above the time slider
+SUGGESTED_EFFECT = 'Suggested'  # Effect name of onset suggestions that were not accepted yet
+SUGGESTION_GAP_MS = 50  # Onsets this close to an existing effect are not suggested
+TAP_LATENCY_MS = 0  # Operator reaction time subtracted from every added effect
+REFRESH_HZ = 30  # UI refresh rate while a track is playing, 0 disables timed refreshes
+
+# VLC player events forwarded into the PySimpleGUI event queue, by vlc.EventType name
+VLC_EVENTS = {
+    'VLC_PLAYING': 'MediaPlayerPlaying',
+    'VLC_PAUSED': 'MediaPlayerPaused',
+    'VLC_STOPPED': 'MediaPlayerStopped',
+    'VLC_END_REACHED': 'MediaPlayerEndReached',
+    'VLC_TIME_CHANGED': 'MediaPlayerTimeChanged',
+}
 
-class MediaPlayer:
 
-    def __init__(self, size, scale=1.0, theme='LightGreen'):
-        """ Media player constructor """
 
-        # Setup media player
-        self.instance = vlc.Instance()
-        self.list_player = self.instance.media_list_player_new()
-        self.media_list = self.instance.media_list_new([])
-        self.list_player.set_media_list(self.media_list)
-        self.player = self.list_player.get_media_player()
+class MediaPlayer:
 
-        self.track_cnt = 0  # Count of tracks loaded into `media_list`
+    def __init__(self, size, scale=1.0, theme='LightGreen', refresh_hz=REFRESH_HZ, outputs=None,
+                 tap_latency_ms=TAP_LATENCY_MS, measure_taps=False, keymap=None, stats_interval=None,
+                 fast_start=False, instance=None, hidden=False):
+        """ Media player constructor, `fast_start` shows the window before VLC is initialised.
+            `instance` defaults to the audio-only VLC instance shared by the whole process.
+            `hidden` keeps the window transparent until show_window(), e.g. while a session is restored. """
+
+        # Effect types, IDs and colours come from Effects.json next to the application, else the bundled one
+        effects_path = os.path.join(self.get_application_path(), EFFECTS_FILENAME)
+        if not os.path.exists(effects_path):
+            effects_path = os.path.join(base_path, EFFECTS_FILENAME)
+        REGISTRY.load(effects_path)
+
+        # Setup media player, in fast start mode on a background thread once the window is shown
+        self.instance = instance
+        self.player = None
+        self.player_thread = None
+        self.session = None  # Queue of loaded tracks, the next ones are prefetched in the background
+        if not fast_start:
+            self.init_player()
+
+        self.track_cnt = 0  # Count of tracks loaded into the session
         self.track_num = 0  # Index of the track currently playing
 
+        self.refresh_hz = refresh_hz
+        self.playing = False  # Playback state as last reported by VLC
+        self.time_changed_pending = False  # Coalesces VLC time-changed events in the queue
+        self.resume = None  # (position in ms, playing) applied once a restored track starts playing
+
+        # Encodings are stored per track in Encodings.db next to the application and cached in memory
+        self.store = open_cached_store(self.get_application_path())
+        self.timeline = EffectTimeline()  # Effects of the current track, sorted by time
+        self.track_path = None  # Path of the current track
+        self.track_key = None  # Store key of the current track, the fingerprint of its content
+        self.legacy_key = None  # Basename key the current track's encoding was stored under, moved on export
+        self.identity = TrackIdentity(os.path.join(self.get_application_path(), CACHE_FILENAME))
+        self.peaks = None  # Waveform peaks of the current track, once decoded
+        self.marker_ids = []  # Graph figures of the effect markers on the waveform
+
+        # High resolution playback clock used to stamp effects and to dispatch them, set up with the player
+        self.clock = None
+        self.tap_latency_ms = tap_latency_ms
+        self.tap_errors = [] if measure_taps else None  # Stamped time minus get_time() of every tap
+
+        # Effects are fired on cue during playback when dispatch outputs are given
+        self.dispatcher = None
+        self.outputs = outputs
+
         # Setup GUI window for output of media
         self.theme = theme
         self.default_bg_color = sg.LOOK_AND_FEEL_TABLE[self.theme]['BACKGROUND']
         self.hover_color = '#6B8E23'  # Slightly darker shade of LightGreen
         self.window_size = size
         self.player_size = [x*scale for x in size]
-        self.window = self.create_window()
+        self.window = self.create_window(hidden)
+        self.table = EffectsTableModel(self.window['EFFECTS_TABLE'], self.timeline)
+        self.hotkeys = HotkeyCapture(self.window, keymap or REGISTRY.keymap())
+        self.writer = ExportWriter(self.store, self.window)  # Exports are written off the GUI thread
+        self.journal = EffectJournal(os.path.join(self.get_application_path(), JOURNAL_DIRNAME))
+        self.export_offsets = {}  # Filename -> journal size when it was exported, compacted once written
+        self.display = None
+        self.stats_interval = stats_interval
+
+        if fast_start:
+            self.window.refresh()  # Paint the window before VLC enumerates its plugins
+            self.player_thread = threading.Thread(target=self.init_player, daemon=True)
+            self.player_thread.start()
+        else:
+            self.wait_player()
+
+    def init_player(self):
+        """ Create the VLC player, on a background thread in fast start mode """
+        if self.instance is None:
+            self.instance = get_instance()  # Slow the first time, kept off the path to the first window
+        self.player = self.instance.media_player_new()
+        if self.player_thread is not None:
+            self.window.write_event_value('VLC_READY', None)
+
+    def wait_player(self):
+        """ Wait for VLC to be initialised and wire the player to the window, once """
+        if self.clock is not None:
+            return
+        if self.player_thread is not None:
+            self.player_thread.join()
+        self.clock = PlaybackClock(self.player, self.tap_latency_ms)
+        self.session = TrackSession(self.instance, self.writer, self.identity)  # Reads see exports not written yet
+        self.display = TrackDisplay(self.window, self.player, self.clock, self.stats_interval)
+        if self.outputs:
+            self.dispatcher = EffectDispatcher(self.clock, self.outputs, self.timeline, skip=(SUGGESTED_EFFECT,))
+            self.dispatcher.start()
         self.check_platform()
+        self.attach_player_events()
 
         # Unmute the volume if muted
         if self.player.audio_get_mute():
@@ -51,31 +156,43 @@ class MediaPlayer:
 
     def button(self, key, image, **kwargs):
         """ Create media player button """
-        return sg.Button(image_filename=image, border_width=0, pad=(0, 0), key=key,
+        self.button_images[key] = image
+        return sg.Button(image_data=BUTTON_IMAGES.data[image], border_width=0, pad=(0, 0), key=key,
                          button_color=(self.hover_color, self.default_bg_color))  # Swapped colors for hover effect
 
-    def create_window(self):
+    def create_window(self, hidden=False):
         """ Create GUI instance """
         sg.change_look_and_feel(self.theme)
 
         # Column layout for media player button controls
-        col1 = [[self.button('SKIP PREVIOUS', BUTTON_DICT['START']),
-                 self.button('PAUSE', BUTTON_DICT['PAUSE_OFF']),
-                 self.button('PLAY', BUTTON_DICT['PLAY_OFF'], button_color=('white', 'green'), bind_return_key=True),
-                 self.button('STOP', BUTTON_DICT['STOP']),
-                 self.button('SOUND', BUTTON_DICT['SOUND_ON']),
-                 self.button('PLUS', BUTTON_DICT['PLUS'])]]
-
-        # Column layout for effects
+        self.button_images = {}  # Button key -> name of the image shown at startup
+        col1 = [[self.button('SKIP PREVIOUS', 'START'),
+                 self.button('PAUSE', 'PAUSE_OFF'),
+                 self.button('PLAY', 'PLAY_OFF', button_color=('white', 'green'), bind_return_key=True),
+                 self.button('STOP', 'STOP'),
+                 self.button('SKIP NEXT', 'END'),
+                 self.button('SOUND', 'SOUND_ON'),
+                 self.button('PLUS', 'PLUS')]]
+
+        # Column layout for effects, offering every configured effect type
+        effect_names = [effect_type.name for effect_type in REGISTRY.configured()]
         col2 = [[sg.Button('Add effect', key='ADD_EFFECT', visible=True),
                  sg.Button('Remove effect', key='REMOVE_EFFECT', visible=True),
                  sg.Button('Export', key='EXPORT', visible=True),
-                 sg.Combo(['Affect1', 'Affect2', 'Affect3'], key='EFFECTS', default_value='Affect1', visible=True)],
+                 sg.Button('Suggest', key='SUGGEST', visible=True),
+                 sg.Button('Accept', key='ACCEPT_SUGGESTIONS', visible=True),
+                 sg.Button('Reject', key='REJECT_SUGGESTIONS', visible=True),
+                 sg.Combo(effect_names, key='EFFECTS', default_value=effect_names[0], visible=True),
+                 sg.Checkbox('Hotkeys', key='HOTKEYS', enable_events=True, tooltip='Add effects with the keyboard')],
                 [sg.Table(values=[], headings=['Timestamp', 'Effect'], display_row_numbers=True, 
                           key='EFFECTS_TABLE', visible=True, size=(self.window_size[0], 10), enable_events=True)]]
 
         # Main GUI layout
         main_layout = [
+            # Waveform of the current track with a marker at every effect
+            [sg.Graph(canvas_size=(self.window_size[0], WAVEFORM_HEIGHT), graph_bottom_left=(0, -1),
+                      graph_top_right=(self.window_size[0], 1), background_color='white', key='WAVEFORM')],
+
             # Element for tracking elapsed time
             [sg.Text('00:00:00', key='TIME_ELAPSED'),
              sg.Slider(range=(0, 1), enable_events=True, resolution=0.0001, disable_number_display=True,
@@ -89,12 +206,24 @@ class MediaPlayer:
             [sg.Text('', key='ENCODING_STATUS', text_color='green', visible=False)]]
 
         # Create a PySimpleGUI window from the specified parameters
-        window = sg.Window('69 Box Encoder', main_layout, element_justification='center', icon=ICON, finalize=True)
+        window = sg.Window('69 Box Encoder', main_layout, element_justification='center', icon=ICON, finalize=True,
+                           alpha_channel=0 if hidden else 1)
 
         # Expand the time element so that the row elements are positioned correctly
         window['TIME'].expand(expand_x=True)
+
+        # Share the images PySimpleGUI decoded for the buttons and decode the rest once, so switches never decode
+        for key, image in self.button_images.items():
+            BUTTON_IMAGES.adopt(window[key], image)
+        BUTTON_IMAGES.preload(window.TKroot)
         return window
 
+    def set_button_image(self, key, image, window=None):
+        """ Switch a media player button to one of the preloaded images """
+        window = window or self.window
+        if image in BUTTON_IMAGES:
+            BUTTON_IMAGES.show(window[key], image)
+
     def check_platform(self):
         """ Platform specific adjustments for window handler """
         if PLATFORM.startswith('linux'):
@@ -102,54 +231,142 @@ class MediaPlayer:
         else:
             self.player.set_hwnd(self.window.TKroot.winfo_id())
 
+    def attach_player_events(self):
+        """ Forward VLC player events to the GUI event queue """
+        import vlc
+        event_manager = self.player.event_manager()
+        for key, event_type in VLC_EVENTS.items():
+            event_manager.event_attach(getattr(vlc.EventType, event_type), self.post_player_event, key)
+
+    def post_player_event(self, vlc_event, key):
+        """ Called on the VLC thread, so only hand the event over to the GUI thread """
+        if key == 'VLC_TIME_CHANGED':
+            if self.time_changed_pending:
+                return  # An update is already queued, no need to flood the window
+            self.time_changed_pending = True
+        self.window.write_event_value(key, None)
+
+    def handle_player_event(self, event):
+        """ Update the player state from a forwarded VLC event """
+        if event == 'VLC_TIME_CHANGED':
+            self.time_changed_pending = False
+        elif event == 'VLC_PLAYING':
+            self.playing = True
+            if self.dispatcher:
+                self.dispatcher.wake()  # Idle until now
+            if self.resume is not None:
+                self.resume_session()
+        else:
+            self.playing = False
+        if event == 'VLC_END_REACHED':
+            self.set_button_image('PLAY', 'PLAY_OFF')
+            self.set_button_image('PAUSE', 'PAUSE_OFF')
+        self.get_track_info()
+
+    def read_timeout(self):
+        """ Milliseconds to wait for the next event, None to sleep until one arrives """
+        if self.playing and self.refresh_hz > 0:
+            return max(1, int(1000 / self.refresh_hz))
+        return None
+
     def add_media(self, track=None):
-        """ Add new track to list player """
-        if track is None:
+        """ Add new tracks to the session and play the first of them, `track` is a path or a list of paths """
+        if not track:
             return  # User did not provide any information
-
-        # Stop the current track before adding a new one
-        self.player.stop()
-        self.window['PLAY'].update(image_filename=BUTTON_DICT['PLAY_OFF'])
-        self.window['PAUSE'].update(image_filename=BUTTON_DICT['PAUSE_OFF'])
-        self.window['TIME'].update(value=0)
-        self.window['TIME_ELAPSED'].update('00:00:00')
-
-        # Clear the media list before adding a new track
-        self.media_list = self.instance.media_list_new([])
-        self.list_player.set_media_list(self.media_list)
-
-        media = self.instance.media_new(track)
-        media.set_meta(0, track.replace('\\', '/').split('/').pop())  # filename
-        media.set_meta(1, 'Local Media')  # Default author value for local media
-        self.media_list.add_media(media)
-        self.track_cnt = self.media_list.count()
-        self.track_num = self.track_cnt - 1  # Update the track number to the newly added track
-
-        # Check if the track is already in the Encodings.json file
-        try:
-            with open('Encodings.json', 'r') as file:
-                data = json.load(file)
-        except FileNotFoundError:
-            data = []
-
-        existing_entry = next((item for item in data if item["filename"] == media.get_meta(0)), None)
-        if existing_entry:
+        tracks = [track] if isinstance(track, str) else list(track)
+        self.show_track(self.session.add(tracks))
+
+    def show_track(self, index, start_ms=0):
+        """ Play track `index` of the session with its effects, prefetched media start at once.
+            `start_ms` starts playback further into the track. """
+        self.track_key, media, timeline, existing_effects = self.session.select(index)
+        self.legacy_key = self.session.legacy_key(self.session.current, self.track_key)
+        if start_ms:
+            # A media of its own, the start time option would stick to the prefetched one
+            media = self.session.create_media(self.session.current, ':start-time={:.3f}'.format(start_ms / 1000))
+
+        # Swapping the media stops the current track
+        self.player.set_media(media)
+        self.set_button_image('PLAY', 'PLAY_OFF')
+        self.set_button_image('PAUSE', 'PAUSE_OFF')
+        self.display.set_media()
+        self.track_cnt = len(self.session)
+        self.track_num = index
+
+        # Decode the waveform in the background, the event loop must not wait for it
+        track = self.session.current
+        self.track_path = track
+        self.peaks = None
+        self.draw_waveform()
+        threading.Thread(target=self.load_peaks, args=(track,), daemon=True).start()
+
+        # Check if the track already has a stored encoding
+        if existing_effects is not None:
             # Update the status text and make it visible
             self.window['ENCODING_STATUS'].update('Editing an existing encoding: {}'.format(media.get_meta(0)))
             self.window['ENCODING_STATUS'].update(visible=True, text_color='red')
-            # Pre-populate the table with the existing effects
-            self.window['EFFECTS_TABLE'].update(values=existing_entry["effects"])
         else:
             # Update the status text and make it visible
             self.window['ENCODING_STATUS'].update('Creating a new encoding: {}'.format(media.get_meta(0)))
             self.window['ENCODING_STATUS'].update(visible=True, text_color='green')
-            # Empty the table
-            self.window['EFFECTS_TABLE'].update(values=[])
 
-        # Auto play the added track
-        self.list_player.play_item_at_index(self.track_num)
-        self.window['TIME'].update(value=0)
-        self.window['TIME_ELAPSED'].update('00:00:00')
+        # Replay edits that were never exported, e.g. after a crash
+        recovered = replay(timeline, self.journal.open(self.track_key))
+        if recovered:
+            self.window['ENCODING_STATUS'].update('Recovered {} unsaved edits: {}'.format(recovered, media.get_meta(0)))
+        self.set_timeline(timeline)  # Pre-populated with the existing effects, sorted by time
+
+        # Auto play the track
+        self.player.play()
+        self.display.reset()
+
+    def load_peaks(self, track):
+        """ Called on a background thread to load or compute the waveform of `track` """
+        from waveformPeaks import CACHE_DIRNAME, cached_peaks  # Imports NumPy, only needed once a track is loaded
+        try:
+            peaks = cached_peaks(track, os.path.join(self.get_application_path(), CACHE_DIRNAME))
+        except (OSError, RuntimeError):
+            peaks = None  # No decoder available or unreadable file, the waveform stays empty
+        self.window.write_event_value('PEAKS_READY', (track, peaks))
+
+    def show_peaks(self, track, peaks):
+        """ Draw the waveform once it has been loaded, unless another track was loaded since """
+        if track == self.track_path:
+            self.peaks = peaks
+            self.draw_waveform()
+
+    def draw_waveform(self):
+        """ Draw the waveform peaks and effect markers of the current track """
+        graph = self.window['WAVEFORM']
+        graph.erase()
+        self.marker_ids = []
+        if self.peaks is None:
+            return
+        mins, maxs = self.peaks.columns(self.window_size[0])
+        for x, (low, high) in enumerate(zip(mins, maxs)):
+            graph.draw_line((x, low), (x, high), color=self.hover_color)
+        self.draw_markers()
+
+    def draw_marker(self, time_ms, effect_id):
+        """ Draw a single effect marker at `time_ms` milliseconds in the colour of its effect type """
+        x = int(time_ms * self.window_size[0] / max(1, self.peaks.duration_ms))
+        color = REGISTRY.color(effect_id)
+        self.marker_ids.append(self.window['WAVEFORM'].draw_line((x, -1), (x, 1), color=color))
+
+    def draw_markers(self):
+        """ Redraw the effect markers, at most one line per pixel column """
+        graph = self.window['WAVEFORM']
+        for figure in self.marker_ids:
+            graph.delete_figure(figure)
+        self.marker_ids = []
+        if self.peaks is None:
+            return
+        pixel_ms = max(1, self.peaks.duration_ms // self.window_size[0])
+        columns = {}
+        for time_ms, effect_id in zip(self.timeline.times, self.timeline.ids):
+            columns.setdefault(time_ms // pixel_ms * pixel_ms, effect_id)
+        for time_ms, effect_id in sorted(columns.items()):
+            self.draw_marker(time_ms, effect_id)  # One marker per pixel column is enough
 
     def get_meta(self, meta_type):
         """ Retrieve saved meta data from tracks in media list """
@@ -158,119 +375,275 @@ class MediaPlayer:
 
     def get_track_info(self):
         """ Show title and elapsed time if audio is loaded and playing """
-        time_elapsed = "{:02d}:{:02d}:{:03d}".format(*divmod(self.player.get_time() // 1000, 60), self.player.get_time() % 1000)
-        time_total = "{:02d}:{:02d}:{:03d}".format(*divmod(self.player.get_length() // 1000, 60), self.player.get_length() % 1000)
-        if self.player.is_playing():
-            message = "{}".format(self.get_meta(0))
-            self.window['TIME_ELAPSED'].update(time_elapsed)
-            self.window['TIME_TOTAL'].update(time_total)
+        if self.display is not None:
+            self.display.tick(self.playing)  # Also keeps the playback clock locked to VLC between taps
 
     def play(self):
         """ Called when the play button is pressed """
         if self.track_cnt > 0:  # Only play if there is a track loaded
             if self.player.is_playing():
                 self.player.pause()
-                self.window['PLAY'].update(image_filename=BUTTON_DICT['PLAY_OFF'])
-                self.window['PAUSE'].update(image_filename=BUTTON_DICT['PAUSE_ON'])
+                self.set_button_image('PLAY', 'PLAY_OFF')
+                self.set_button_image('PAUSE', 'PAUSE_ON')
             else:
                 self.player.play()
-                self.window['PLAY'].update(image_filename=BUTTON_DICT['PLAY_ON'])
-                self.window['PAUSE'].update(image_filename=BUTTON_DICT['PAUSE_OFF'])
+                self.set_button_image('PLAY', 'PLAY_ON')
+                self.set_button_image('PAUSE', 'PAUSE_OFF')
 
     def pause(self):
         """ Called when the pause button is pressed """
         if self.player.is_playing():
             self.player.pause()
-            self.window['PAUSE'].update(image_filename=BUTTON_DICT['PAUSE_ON'])
-            self.window['PLAY'].update(image_filename=BUTTON_DICT['PLAY_OFF'])
+            self.set_button_image('PAUSE', 'PAUSE_ON')
+            self.set_button_image('PLAY', 'PLAY_OFF')
         else:
             self.player.play()
-            self.window['PAUSE'].update(image_filename=BUTTON_DICT['PAUSE_OFF'])
-            self.window['PLAY'].update(image_filename=BUTTON_DICT['PLAY_ON'])
+            self.set_button_image('PAUSE', 'PAUSE_OFF')
+            self.set_button_image('PLAY', 'PLAY_ON')
 
     def stop(self):
         """ Called when the stop button is pressed """
         self.player.stop()
-        self.window['PLAY'].update(image_filename=BUTTON_DICT['PLAY_OFF'])
-        self.window['PAUSE'].update(image_filename=BUTTON_DICT['PAUSE_OFF'])
-        self.window['TIME'].update(value=0)
-        self.window['TIME_ELAPSED'].update('00:00:00')
+        self.set_button_image('PLAY', 'PLAY_OFF')
+        self.set_button_image('PAUSE', 'PAUSE_OFF')
+        self.display.reset()
 
     def skip_previous(self):
         """ Called when the skip previous button is pressed """
-        self.list_player.previous()
-        self.reset_pause_play()
-        if not self.track_num == 1:
-            self.track_num -= 1
+        index = self.session.previous_index()
+        if index is not None:
+            self.show_track(index)
+            self.reset_pause_play()
+
+    def skip_next(self):
+        """ Called when the skip next button is pressed """
+        index = self.session.next_index()
+        if index is not None:
+            self.show_track(index)
+            self.reset_pause_play()
 
     def reset_pause_play(self):
         """ Reset pause play buttons after skipping tracks """
-        self.window['PAUSE'].update(image_filename=BUTTON_DICT['PAUSE_OFF'])
-        self.window['PLAY'].update(image_filename=BUTTON_DICT['PLAY_ON'])
+        self.set_button_image('PAUSE', 'PAUSE_OFF')
+        self.set_button_image('PLAY', 'PLAY_ON')
 
     def toggle_mute(self):
         """ Called when the sound button is pressed """
-        self.window['SOUND'].update(
-            image_filename=BUTTON_DICT['SOUND_ON'] if self.player.audio_get_mute() else BUTTON_DICT['SOUND_OFF'])
+        self.set_button_image('SOUND', 'SOUND_ON' if self.player.audio_get_mute() else 'SOUND_OFF')
         self.player.audio_set_mute(not self.player.audio_get_mute())
 
     def load_single_track(self):
-        """ Open a file browser directly to select a single track """
-        track = sg.popup_get_file('Browse for local media:', no_window=True, file_types=(("Audio Files", "*.mp3;*.wav;*.ogg;*.flac"),))
-        if track:
-            self.add_media(track)
-
-    def add_effect(self):
-        """ Add an effect to the effects table """
-        effect = self.window['EFFECTS'].get()
-        timestamp = "{:02d}:{:02d}:{:03d}".format(*divmod(self.player.get_time() // 1000, 60), self.player.get_time() % 1000)
-        self.window['EFFECTS_TABLE'].update(values=self.window['EFFECTS_TABLE'].get() + [[timestamp, effect]])
+        """ Open a file browser to select one or more tracks, e.g. a whole album """
+        tracks = sg.popup_get_file('Browse for local media:', no_window=True, multiple_files=True,
+                                   file_types=(("Audio Files", "*.mp3;*.wav;*.ogg;*.flac"),))
+        if isinstance(tracks, str):
+            tracks = tracks.split(';')
+        if tracks:
+            self.add_media([track for track in tracks if track])
+
+    def add_effect(self, effect=None, tap_ns=None):
+        """ Add an effect to the effects table, `tap_ns` is the perf_counter_ns() of a hotkey press """
+        if tap_ns is None:
+            tap_ns = time.perf_counter_ns()  # Stamp the tap before anything else can delay it
+        if effect is None:
+            effect = self.window['EFFECTS'].get()
+        cue_time = self.clock.tap_time(tap_ns)
+        if self.tap_errors is not None:
+            self.tap_errors.append(cue_time - self.player.get_time())
+        self.table.insert(cue_time, effect)
+        self.journal.add(cue_time, effect)
+        if self.peaks is not None:
+            self.draw_marker(cue_time, REGISTRY.intern(effect))
+
+    def toggle_hotkeys(self, enabled):
+        """ Called when the hotkeys checkbox is toggled """
+        if enabled:
+            self.hotkeys.start()
+        else:
+            self.hotkeys.stop()
 
     def remove_effect(self):
         """ Remove an effect from the effects table """
-        selected_rows = self.window['EFFECTS_TABLE'].SelectedRows
+        selected_rows = self.table.selected_rows()
         if selected_rows:
-            table_data = self.window['EFFECTS_TABLE'].get()
-            for row in sorted(selected_rows, reverse=True):
-                del table_data[row]
-            self.window['EFFECTS_TABLE'].update(values=table_data)
-
-    def move_to_timestamp(self, timestamp):
+            for row in selected_rows:
+                if self.timeline.effect_at(row) != SUGGESTED_EFFECT:  # Suggestions are not journaled
+                    self.journal.remove(self.timeline.time_at(row), self.timeline.effect_at(row))
+            self.table.remove(selected_rows)
+            self.draw_markers()
+
+    def suggest_effects(self):
+        """ Start onset detection of the current track on a background thread """
+        if self.track_path is None:
+            return
+        self.window['ENCODING_STATUS'].update('Detecting onsets: {}'.format(self.get_meta(0)))
+        threading.Thread(target=self.load_onsets, args=(self.track_path,), daemon=True).start()
+
+    def load_onsets(self, track):
+        """ Called on a background thread, hands the detected onsets or the error to the event loop """
+        from onsetDetection import detect_onsets  # Imports NumPy, only needed once onsets are asked for
+        try:
+            onsets, error = detect_onsets(track), None
+        except Exception as e:  # Missing ffmpeg, undecodable file, ...
+            onsets, error = [], str(e) or type(e).__name__
+        self.window.write_event_value('ONSETS_READY', (track, onsets, error))
+
+    def show_suggestions(self, track, onsets, error=None):
+        """ Add detected onsets as suggested rows, replacing earlier suggestions """
+        if track != self.track_path:
+            return
+        if error is not None:
+            self.window['ENCODING_STATUS'].update('Onset detection failed: {}'.format(error), visible=True,
+                                                  text_color='red')
+            return
+        effects = EffectTimeline.from_cues(cue for cue in self.timeline if cue[1] != SUGGESTED_EFFECT)
+        suggestions = []
+        for onset_ms in onsets:
+            index = effects.next_index(onset_ms - SUGGESTION_GAP_MS)
+            if index == len(effects) or effects.time_at(index) > onset_ms + SUGGESTION_GAP_MS:
+                suggestions.append((onset_ms, SUGGESTED_EFFECT))
+        self.set_timeline(EffectTimeline.from_cues(list(effects) + suggestions))
+        self.window['ENCODING_STATUS'].update('{} suggested effects: {}'.format(len(onsets), self.get_meta(0)))
+
+    def suggested_rows(self):
+        """ Selected suggestion rows, or every suggestion when none is selected """
+        suggested = REGISTRY.intern(SUGGESTED_EFFECT)
+        rows = [row for row in self.table.selected_rows() if self.timeline.ids[row] == suggested]
+        if rows:
+            return rows
+        return [row for row, effect_id in enumerate(self.timeline.ids) if effect_id == suggested]
+
+    def accept_suggestions(self):
+        """ Turn suggestions into effects of the type picked in the effects combo """
+        rows = self.suggested_rows()
+        effect = self.window['EFFECTS'].get()
+        for row in rows:
+            self.timeline.set_effect(row, effect)
+            self.journal.add(self.timeline.time_at(row), effect)
+        self.table.refresh(rows)
+
+    def reject_suggestions(self):
+        """ Remove suggestions from the table """
+        self.table.remove(self.suggested_rows())
+        self.draw_markers()
+
+    def set_timeline(self, timeline):
+        """ Show a new timeline for the current track in the table, waveform and dispatcher """
+        self.timeline = timeline
+        self.table.load(timeline)
+        self.draw_markers()
+        if self.dispatcher:
+            self.dispatcher.set_timeline(timeline)
+
+    def move_to_timestamp(self, time_in_milliseconds):
         """ Move the audio to the selected timestamp """
-        minutes, seconds, milliseconds = map(int, timestamp.split(':'))
-        time_in_milliseconds = (minutes * 60 + seconds) * 1000 + milliseconds
         self.player.set_time(time_in_milliseconds)
-        self.window['TIME'].update(value=self.player.get_position())  # Update the dragger/progress bar
-        self.get_track_info()  # Update the UI timer immediately after moving the audio
+        self.display.seek(time_in_milliseconds)  # Update the timer and dragger immediately after moving the audio
 
     def export_effects(self):
-        """ Export the effects to a JSON file """
-        filename = self.get_meta(0)  # Get the filename of the current track
-        effects = self.window['EFFECTS_TABLE'].get()  # Get the effects from the table
-        encodings_file_path = os.path.join(self.get_application_path(), 'Encodings.json')
-
-        # Load the existing data from the JSON file
-        try:
-            with open(encodings_file_path, 'r') as file:
-                data = json.load(file)
-        except FileNotFoundError:
-            data = []
-
-        # Check if the filename already exists in the data
-        existing_entry = next((item for item in data if item["filename"] == filename), None)
-        if existing_entry:
-            # Replace the existing entry with the new effects
-            existing_entry["effects"] = effects
+        """ Export the effects of the current track, written to the encoding store in the background """
+        if self.track_key is None:
+            return  # No track loaded yet
+        filename = self.track_key  # Tracks are stored by the fingerprint of their content
+        # Get the effects in the Encodings.json format, leaving out suggestions nobody accepted
+        effects = [row for row in self.timeline.to_json() if row[1] != SUGGESTED_EFFECT]
+        # Exports made in quick succession are written together, a basename entry moves to the fingerprint
+        self.writer.submit(filename, effects, replaces=self.legacy_key)
+        self.legacy_key = None
+        self.export_offsets[filename] = self.journal.offset()
+
+    def compact_journals(self, filenames):
+        """ Drop journaled edits that are part of an export that has been written """
+        for filename in filenames:
+            if filename in self.export_offsets and not self.writer.is_pending(filename):
+                self.journal.compact(filename, self.export_offsets.pop(filename))
+
+    def show_export_status(self, state, detail):
+        """ Show the state of the background writer in the status text """
+        if state == 'pending':
+            message, color = 'Export pending: {} track(s) waiting to be written'.format(detail), 'orange'
+        elif state == 'flushed':
+            written, before, after, deleted = detail
+            self.store.absorb(written, before, after, deleted)  # Own exports must not make the cache re-read
+            if self.track_key in written:
+                message, color = 'Exported: {}'.format(self.get_meta(0)), 'green'
+            else:
+                message, color = 'Exported {} track(s)'.format(len(written)), 'green'
+            self.compact_journals(sorted(written))
         else:
-            # Append the new data
-            data.append({
-                'filename': filename,
-                'effects': effects
-            })
-
-        # Write the data back to the JSON file
-        with open(encodings_file_path, 'w') as file:
-            json.dump(data, file, indent=4)
+            message, color = 'Export failed, retrying: {}'.format(detail), 'red'
+        self.window['ENCODING_STATUS'].update(message, visible=True, text_color=color)
+
+    def close(self):
+        """ Stop background work and close the window """
+        self.hotkeys.stop()
+        unwritten = self.writer.close()  # Flush pending exports before the window goes away
+        if unwritten:
+            print('Could not export: {}'.format(', '.join(unwritten)))
+        self.compact_journals([filename for filename in list(self.export_offsets) if filename not in unwritten])
+        self.journal.close()
+        self.identity.save()
+        if self.session:
+            self.session.close()
+        if self.dispatcher:
+            self.dispatcher.stop()
+        if self.tap_errors:
+            self.report_tap_errors()
+        if self.stats_interval is not None:
+            self.report_cache_stats()
+        self.window.close()
+
+    def snapshot_session(self):
+        """ Tracks, playback position and table rows of the session, handed to the next process on hot reload """
+        if self.session is None or self.session.current is None:
+            return {'tracks': []}
+        position_ms = self.player.get_time() if self.resume is None else self.resume[0]
+        playing = self.playing if self.resume is None else self.resume[1]
+        return {'tracks': list(self.session.tracks), 'index': self.session.index, 'position_ms': max(0, position_ms),
+                'playing': playing, 'rows': self.timeline.to_json()}
+
+    def restore_session(self, state):
+        """ Load a session written by snapshot_session(), starting at its position.
+            A paused session stays muted until VLC has started and it is paused again. """
+        self.wait_player()
+        if not state.get('tracks'):
+            return
+        muted = self.player.audio_get_mute()
+        if not state['playing']:
+            self.player.audio_set_mute(True)
+        self.session.add(state['tracks'])
+        self.show_track(state['index'], start_ms=state['position_ms'])
+        self.set_timeline(EffectTimeline.from_rows(state['rows']))  # Unexported rows and suggestions included
+        self.resume = (state['position_ms'], state['playing'], muted)
+
+    def resume_session(self):
+        """ Once a restored track plays, show its position and pause it unless the old process was playing """
+        position_ms, playing, muted = self.resume
+        self.resume = None
+        self.display.seek(position_ms)
+        if playing:
+            self.reset_pause_play()
+        else:
+            self.pause()
+            self.player.audio_set_mute(muted)
+
+    def show_window(self):
+        """ Make a window created with `hidden` visible """
+        self.window.set_alpha(1)
+
+    def report_tap_errors(self):
+        """ Print how far the stamped tap times were from VLC's own get_time() """
+        errors = sorted(self.tap_errors)
+        print('Tap stamping against get_time() over {} taps (ms):'.format(len(errors)))
+        for percent in (1, 10, 50, 90, 99):
+            print('  p{:<3} {:>6}'.format(percent, errors[min(len(errors) - 1, len(errors) * percent // 100)]))
+
+    def report_cache_stats(self):
+        """ Print how often the encoding cache was current and how often it re-read the store """
+        stats = self.store.stats()
+        lookups = stats['hits'] + stats['misses']
+        print('Encoding cache: {} hits, {} misses ({:.1f}% hit rate)'.format(
+            stats['hits'], stats['misses'], 100 * stats['hits'] / lookups if lookups else 0))
 
     def get_application_path(self):
         if getattr(sys, 'frozen', False):
@@ -281,48 +654,142 @@ class MediaPlayer:
             return os.path.dirname(os.path.abspath(__file__))
 
 
+def handle_event(mp, event, values):
+    """ Dispatch a single window event to the media player """
+    mp.wait_player()  # Returns at once unless VLC is still being initialised in fast start mode
+    if event in VLC_EVENTS:
+        mp.handle_player_event(event)
+    if event == 'PEAKS_READY':
+        mp.show_peaks(*values['PEAKS_READY'])
+    if event == 'ONSETS_READY':
+        mp.show_suggestions(*values['ONSETS_READY'])
+    if event == 'SUGGEST':
+        mp.suggest_effects()
+    if event == 'ACCEPT_SUGGESTIONS':
+        mp.accept_suggestions()
+    if event == 'REJECT_SUGGESTIONS':
+        mp.reject_suggestions()
+    if event == 'PLAY':
+        mp.play()
+    if event == 'PAUSE':
+        mp.pause()
+    if event == 'SKIP PREVIOUS':
+        mp.skip_previous()
+    if event == 'SKIP NEXT':
+        mp.skip_next()
+    if event == 'STOP':
+        mp.stop()
+    if event == 'SOUND':
+        mp.toggle_mute()
+    if event == 'TIME':
+        # Check if the player is playing before setting the position
+        if mp.player.is_playing():
+            mp.player.set_position(values['TIME'])
+    if event == 'PLUS':
+        mp.load_single_track()
+    if event == 'ADD_EFFECT':
+        mp.add_effect()
+    if event == 'HOTKEY':
+        tap_ns, effect = values['HOTKEY']
+        mp.add_effect(effect, tap_ns)
+    if event == 'HOTKEYS':
+        mp.toggle_hotkeys(values['HOTKEYS'])
+    if event == 'REMOVE_EFFECT':
+        mp.remove_effect()
+    if event == 'EFFECTS_TABLE':
+        # Check if the table has at least one row selected
+        selected_rows = mp.table.selected_rows()
+        if selected_rows:
+            # Get the first selected row index
+            selected_row_index = selected_rows[0]
+            # Retrieve the timestamp from the selected row
+            mp.move_to_timestamp(mp.timeline.time_at(selected_row_index))
+    if event == 'EXPORT':
+        mp.export_effects()
+    if event == 'EXPORT_STATUS':
+        mp.show_export_status(*values['EXPORT_STATUS'])
+
+
+def run(mp, poll=False, duration=None):
+    """ Run the event loop until the window is closed or `duration` seconds have passed.
+        `poll` restores the old 1 ms polling loop, which is kept for benchmarking. """
+    deadline = None if duration is None else time.monotonic() + duration
+    while True:
+        timeout = 1 if poll else mp.read_timeout()
+        if deadline is not None:
+            remaining = max(0, int((deadline - time.monotonic()) * 1000))
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        event, values = mp.window.read(timeout=timeout)
+        if poll or event == sg.TIMEOUT_KEY:
+            mp.get_track_info()
+        if event in (None, 'Exit'):
+            return False
+        if event == HOT_RELOAD:
+            # watchDog.py restarts the application, the next process continues this session
+            write_state(values[HOT_RELOAD], mp.snapshot_session())
+            return False
+        handle_event(mp, event, values)
+        if deadline is not None and time.monotonic() >= deadline:
+            return True
+
+
 def main():
     """ The main program function """
 
-    # Create the media player
-    mp = MediaPlayer(size=(720, 100), scale=1)
+    parser = argparse.ArgumentParser(description='69 Box Encoder')
+    parser.add_argument('--dispatch', choices=['stdout', 'socket'], help='fire effects on cue during playback')
+    parser.add_argument('--dispatch-port', type=int, default=6969, help='UDP port for --dispatch socket')
+    parser.add_argument('--tap-latency', type=int, default=TAP_LATENCY_MS, help='operator latency in ms')
+    parser.add_argument('--measure-taps', action='store_true', help='report tap timing jitter on exit')
+    parser.add_argument('--display-stats', type=float, metavar='SECONDS',
+                        help='print libvlc calls and widget updates per second at this interval, '
+                             'and the encoding cache hit rate on exit')
+    parser.add_argument('--fast-start', action='store_true',
+                        help='show the window first and initialise VLC in the background')
+    parser.add_argument('--startup-report', action='store_true',
+                        help='print when the window was shown and the player was ready, then exit')
+    args = parser.parse_args()
+
+    outputs = []
+    if args.dispatch == 'stdout':
+        outputs.append(StdoutOutput())
+    elif args.dispatch == 'socket':
+        outputs.append(SocketOutput(port=args.dispatch_port))
+
+    # Session handed over by the previous process when hot reloading under watchDog.py
+    reload_path = state_path()
+    state = read_state(reload_path)
 
-    # Main event loop
-    while True:
-        event, values = mp.window.read(timeout=1)  # Reduced timeout for more frequent updates
-        mp.get_track_info()
-        if event in (None, 'Exit'):
-            break
-        if event == 'PLAY':
-            mp.play()
-        if event == 'PAUSE':
-            mp.pause()
-        if event == 'SKIP PREVIOUS':
-            mp.skip_previous()
-        if event == 'STOP':
-            mp.stop()
-        if event == 'SOUND':
-            mp.toggle_mute()
-        if event == 'TIME':
-            # Check if the player is playing before setting the position
-            if mp.player.is_playing():
-                mp.player.set_position(values['TIME'])
-        if event == 'PLUS':
-            mp.load_single_track()
-        if event == 'ADD_EFFECT':
-            mp.add_effect()
-        if event == 'REMOVE_EFFECT':
-            mp.remove_effect()
-        if event == 'EFFECTS_TABLE':
-            # Check if the table has at least one row selected
-            if values['EFFECTS_TABLE']:
-                # Get the first selected row index
-                selected_row_index = values['EFFECTS_TABLE'][0]
-                # Retrieve the timestamp from the selected row
-                timestamp = mp.window['EFFECTS_TABLE'].get()[selected_row_index][0]
-                mp.move_to_timestamp(timestamp)
-        if event == 'EXPORT':
-            mp.export_effects()
+    # Create the media player
+    mp = MediaPlayer(size=(720, 100), scale=1, outputs=outputs, tap_latency_ms=args.tap_latency,
+                     measure_taps=args.measure_taps, stats_interval=args.display_stats, fast_start=args.fast_start,
+                     hidden=state is not None)
+    if state is not None:
+        # Set aside before restoring, a state that crashes the restore must not be handed to every later reload
+        failed_path = quarantine_state(reload_path)
+        try:
+            mp.restore_session(state)  # Before the window is shown, so it appears as it was left
+        except Exception:
+            traceback.print_exc()
+            print('Could not restore the session, kept it in {}'.format(failed_path))
+        else:
+            remove_state(failed_path)
+        mp.show_window()
+    if reload_path is not None:
+        listen(mp.window, reload_path)
+
+    if args.startup_report:
+        # Wall clock times, so startupBenchmark.py can measure from the moment it spawned the process
+        mp.window.refresh()
+        print('window {:.6f}'.format(time.time()), flush=True)
+        mp.wait_player()
+        print('player {:.6f}'.format(time.time()), flush=True)
+        mp.close()
+        return
+
+    # Main event loop, woken by user input, VLC events and the refresh timer while playing
+    run(mp)
+    mp.close()
 
 
 if __name__ == '__main__':
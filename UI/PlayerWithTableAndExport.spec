@@ -5,7 +5,7 @@ a = Analysis(
     ['PlayerWithTableAndExport.py'],
     pathex=[],
     binaries=[],
-    datas=[('Assets', 'Assets')],
+    datas=[('Assets', 'Assets'), ('Effects.json', '.')],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
@@ -15,19 +15,17 @@ a = Analysis(
 )
 pyz = PYZ(a.pure)
 
+# One-dir build: nothing is unpacked to a temp dir or decompressed on launch
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='PlayerWithTableAndExport',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
+    upx=False,
     console=True,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -35,3 +33,12 @@ exe = EXE(
     codesign_identity=None,
     entitlements_file=None,
 )
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='PlayerWithTableAndExport',
+)
@@ -0,0 +1,45 @@
+"""
+    Streaming audio decoder
+
+    Decodes any format ffmpeg understands to mono 16-bit samples and yields them
+    in fixed-size NumPy blocks, so callers never hold a whole track in memory.
+    ffmpeg must be on the PATH, or named by the FFMPEG environment variable.
+"""
+import os
+import shutil
+import subprocess
+
+import numpy as np
+
+DECODE_RATE = 8000  # Samples per second of the decoded mono signal
+BLOCK_SIZE = 65536  # Samples per yielded block
+
+
+def ffmpeg_path():
+    """ Location of the ffmpeg binary, raises when it is not installed """
+    path = os.environ.get('FFMPEG') or shutil.which('ffmpeg')
+    if not path:
+        raise RuntimeError('ffmpeg is required to decode audio, install it or set FFMPEG')
+    return path
+
+
+def decode_blocks(path, sample_rate=DECODE_RATE, block_size=BLOCK_SIZE):
+    """ Yield int16 mono sample blocks of `path` resampled to `sample_rate` """
+    command = [ffmpeg_path(), '-v', 'error', '-nostdin', '-i', path,
+               '-f', 's16le', '-acodec', 'pcm_s16le', '-ac', '1', '-ar', str(sample_rate), '-']
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        while True:
+            data = process.stdout.read(block_size * 2)
+            if not data:
+                break
+            yield np.frombuffer(data[:len(data) // 2 * 2], dtype='<i2')
+        error = process.stderr.read().decode(errors='replace').strip()
+        if process.wait() != 0:
+            raise RuntimeError('ffmpeg could not decode {}: {}'.format(path, error))
+    finally:
+        if process.poll() is None:
+            process.kill()  # The caller stopped reading early
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
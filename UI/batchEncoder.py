@@ -0,0 +1,183 @@
+"""
+    Headless batch validator for stored encodings
+
+    Matches every stored encoding, keyed by track fingerprint or by an older
+    basename key, against the media files found under a directory and checks that the file exists, that every timestamp parses and that every cue
+    falls within the media length. Media lengths are probed with libvlc on a
+    process pool. Effects are normalized (parsed, sorted and re-formatted) through
+    EffectTimeline, and written back to the store with --write. Encodings with
+    rows that cannot be parsed are left unchanged unless --drop-invalid is given,
+    since writing them back would drop those rows.
+
+    Usage: python batchEncoder.py [media_directory] --report report.json [--write [--drop-invalid]]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from encodingStore import open_default_store, open_store
+from effectTimeline import EffectTimeline, parse_timestamp
+from trackIdentity import CACHE_FILENAME, TrackIdentity
+from vlcInstance import get_instance
+
+MEDIA_EXTENSIONS = ('.mp3', '.wav', '.ogg', '.flac')
+PROBE_TIMEOUT_MS = 5000
+
+
+def find_media(directory):
+    """ Map media basenames to their paths, a basename found twice maps to all of its paths """
+    media = {}
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.lower().endswith(MEDIA_EXTENSIONS):
+                media.setdefault(name, []).append(os.path.join(root, name))
+    return media
+
+
+def probe_length(path):
+    """ Media length in milliseconds as reported by libvlc, -1 if unknown """
+    import vlc
+    media = get_instance().media_new_path(path)  # One instance per worker process
+    media.parse_with_options(vlc.MediaParseFlag.local, PROBE_TIMEOUT_MS)
+    deadline = time.monotonic() + PROBE_TIMEOUT_MS / 1000
+    while media.get_parsed_status() == 0 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    length = media.get_duration()
+    media.release()
+    return length
+
+
+def normalize_effects(effects):
+    """ Parse and sort stored rows, returns (timeline, list of rows that could not be parsed) """
+    valid, invalid = [], []
+    for row in effects:
+        try:
+            timestamp, effect = row
+            parse_timestamp(timestamp)
+            valid.append([timestamp, effect])
+        except (TypeError, ValueError, AttributeError):
+            invalid.append(row)
+    return EffectTimeline.from_rows(valid), invalid
+
+
+def validate(filename, effects, paths, length):
+    """ Report entry for one stored encoding """
+    timeline, invalid = normalize_effects(effects)
+    issues = []
+    if not paths:
+        issues.append('missing media file')
+    elif len(paths) > 1:
+        issues.append('filename matches {} media files'.format(len(paths)))
+    if invalid:
+        issues.append('{} unparseable timestamps: {}'.format(len(invalid), invalid))
+    if length is not None:  # None when probing was skipped or there is no file to probe
+        if length > 0:
+            late = len(timeline) - timeline.next_index(length + 1)
+            if late:
+                issues.append('{} cues after the end of the media ({} ms)'.format(late, length))
+        else:
+            issues.append('media length could not be probed')
+    normalized = timeline.to_json()
+    return {
+        'filename': filename,
+        'paths': paths,
+        'length_ms': length,
+        'cues': len(timeline),
+        'normalized': normalized != effects,
+        'invalid_rows': len(invalid),
+        'issues': issues,
+    }, normalized
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate and normalize stored encodings against a media library')
+    parser.add_argument('directory', help='media library to match encodings against')
+    parser.add_argument('--store', help='Encodings.db or Encodings.json, defaults to the one next to this script')
+    parser.add_argument('--report', default='report.json', help='where to write the JSON report')
+    parser.add_argument('--write', action='store_true', help='store the normalized effects back')
+    parser.add_argument('--drop-invalid', action='store_true',
+                        help='with --write, also store encodings whose unparseable rows are dropped')
+    parser.add_argument('--workers', type=int, default=None, help='probe processes, defaults to the CPU count')
+    parser.add_argument('--no-probe', action='store_true', help='skip media length checks')
+    args = parser.parse_args()
+
+    if args.store:
+        store = open_store(args.store)
+    else:
+        store = open_default_store(os.path.dirname(os.path.abspath(__file__)))
+    media = find_media(args.directory)
+    encodings = list(store.items())
+
+    # Encodings are keyed by fingerprint, or by basename if they were stored before fingerprinting
+    identity = TrackIdentity(os.path.join(os.path.dirname(os.path.abspath(__file__)), CACHE_FILENAME))
+    fingerprints = {}
+    keys = {}  # Path -> fingerprint, for every file that could be read
+    unreadable = []
+    for name, paths in media.items():
+        for path in paths:
+            try:
+                keys[path] = identity.key(path)
+            except OSError as e:
+                print('Could not read {}: {}'.format(path, e))
+                unreadable.append(path)
+                continue
+            fingerprints.setdefault(keys[path], []).append(path)
+    identity.save()
+
+    def media_paths(key):
+        return media.get(key) or fingerprints.get(key, [])
+
+    # Probe every matched file once, spread over a process pool
+    lengths = {}
+    if not args.no_probe:
+        probe_paths = sorted({media_paths(key)[0] for key, _ in encodings if media_paths(key)})
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            chunksize = max(1, len(probe_paths) // (4 * (args.workers or os.cpu_count() or 1)))
+            lengths = dict(zip(probe_paths, pool.map(probe_length, probe_paths, chunksize=chunksize)))
+
+    tracks = []
+    updates = []
+    kept = []  # Encodings with unparseable rows that are not written, they would lose those rows
+    for filename, effects in encodings:
+        paths = media_paths(filename)
+        length = lengths.get(paths[0]) if paths and not args.no_probe else None
+        entry, normalized = validate(filename, effects, paths, length)
+        tracks.append(entry)
+        if entry['invalid_rows'] and not args.drop_invalid:
+            kept.append(filename)
+        elif entry['normalized']:
+            updates.append((filename, normalized))
+
+    if args.write:
+        store.put_many(updates)
+    store.close()
+
+    encoded = {filename for filename, _ in encodings}
+    report = {
+        'tracks': len(tracks),
+        'with_issues': sum(1 for track in tracks if track['issues']),
+        'normalized': len(updates),
+        'written': args.write,
+        'kept_invalid': kept,
+        'unreadable_media': unreadable,
+        'unencoded_media': sorted(name for name, paths in media.items() if name not in encoded and not any(
+            keys.get(path) in encoded for path in paths)),
+        'results': tracks,
+    }
+    with open(args.report, 'w') as file:
+        json.dump(report, file, indent=4)
+
+    print("Validated {} encodings, {} with issues, {} normalized{}. Report written to {}".format(
+        report['tracks'], report['with_issues'], report['normalized'], ' and written' if args.write else '',
+        args.report))
+    if kept:
+        print("Left {} encodings with unparseable rows unchanged, see kept_invalid in the report; "
+              "--drop-invalid writes them without those rows".format(len(kept)))
+    sys.exit(1 if report['with_issues'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+    Preloaded button images
+
+    Every PNG in Assets/ is read once at startup and decoded into a Tk PhotoImage
+    the first time a window needs it. Images a button was created with are taken
+    over from PySimpleGUI instead, so none is decoded twice. All PySimpleGUI
+    windows share one Tk interpreter, so the decoded images are shared by every
+    window. Switching a button image only points the Tk button at an already
+    decoded image, without touching the filesystem or decoding the PNG again.
+"""
+import base64
+import os
+import tkinter as tk
+
+
+class ButtonImages:
+    """ Button images keyed by upper case file stem, e.g. 'PLAY_ON' for play_on.png """
+
+    def __init__(self, directory):
+        self.data = {}  # Name -> base64 encoded PNG, also usable as image_data of an sg.Button
+        for filename in sorted(os.listdir(directory)):
+            stem, ext = os.path.splitext(filename)
+            if ext.lower() == '.png':
+                with open(os.path.join(directory, filename), 'rb') as f:
+                    self.data[stem.upper()] = base64.b64encode(f.read())
+        self.photos = {}  # Tk interpreter -> {name: PhotoImage}
+
+    def __contains__(self, name):
+        return name in self.data
+
+    def photo(self, name, master):
+        """ PhotoImage of `name` for the Tk interpreter of `master`, decoded on first use """
+        photos = self.photos.setdefault(master.tk, {})
+        if name not in photos:
+            photos[name] = tk.PhotoImage(data=self.data[name], master=master)
+        return photos[name]
+
+    def adopt(self, element, name):
+        """ Share the PhotoImage PySimpleGUI decoded for a button created with image_data=data[name] """
+        widget = element.Widget
+        photo = getattr(widget, 'image', None)
+        if photo is not None:
+            self.photos.setdefault(widget.tk, {}).setdefault(name, photo)
+
+    def preload(self, master):
+        """ Decode every image not adopted yet up front so no toggle pays for decoding """
+        for name in self.data:
+            self.photo(name, master)
+
+    def show(self, element, name):
+        """ Switch the image of a PySimpleGUI button by reference """
+        widget = element.Widget
+        photo = self.photo(name, widget)
+        if widget.cget('image') == str(photo):
+            return
+        widget.configure(image=photo, width=photo.width(), height=photo.height())
+        widget.image = photo  # Tk only holds the image name, keep a Python reference as PySimpleGUI does
@@ -0,0 +1,76 @@
+"""
+    CPU usage benchmark for the PlayerWithTableAndExport event loop
+
+    Measures process CPU time spent while a track is playing and while it sits
+    paused, once with the old 1 ms polling loop and once with the event driven loop.
+    The polling case runs legacy_track_info(), a copy of the get_track_info() of
+    that loop, rather than today's cached display updates.
+
+    Usage: python cpuBenchmark.py [track] [seconds]
+"""
+import sys
+import time
+import json
+
+import PlayerWithTableAndExport as player
+
+
+def legacy_track_info(mp):
+    """ get_track_info() as the polling loop ran it every millisecond: five libvlc calls and two updates """
+    time_elapsed = "{:02d}:{:02d}:{:03d}".format(*divmod(mp.player.get_time() // 1000, 60),
+                                                 mp.player.get_time() % 1000)
+    time_total = "{:02d}:{:02d}:{:03d}".format(*divmod(mp.player.get_length() // 1000, 60),
+                                               mp.player.get_length() % 1000)
+    if mp.player.is_playing():
+        message = "{}".format(mp.get_meta(0))
+        mp.window['TIME_ELAPSED'].update(time_elapsed)
+        mp.window['TIME_TOTAL'].update(time_total)
+
+
+def measure(mp, poll, seconds):
+    """ Return the CPU seconds consumed by the event loop over `seconds` of wall time """
+    if poll:
+        mp.get_track_info = lambda: legacy_track_info(mp)  # Instance attribute, shadows the method
+    start = time.process_time()
+    try:
+        player.run(mp, poll=poll, duration=seconds)
+    finally:
+        if poll:
+            del mp.get_track_info
+    return time.process_time() - start
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python cpuBenchmark.py [track] [seconds]")
+        sys.exit(1)
+
+    track = sys.argv[1]
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+
+    mp = player.MediaPlayer(size=(720, 100), scale=1)
+    mp.add_media(track)
+    player.run(mp, duration=1.0)  # Let VLC start playing and report its state
+
+    results = {}
+    for loop, poll in (('poll', True), ('event', False)):
+        if not mp.player.is_playing():
+            mp.play()
+        player.run(mp, duration=0.5)
+        results[loop + '_playing'] = measure(mp, poll, seconds)
+
+        mp.pause()
+        player.run(mp, duration=0.5)
+        results[loop + '_paused'] = measure(mp, poll, seconds)
+
+    mp.window.close()
+    mp.player.stop()
+
+    print('{:<16}{:>12}{:>12}'.format('loop', 'cpu (s)', 'cpu (%)'))
+    for name, cpu in results.items():
+        print('{:<16}{:>12.3f}{:>12.1f}'.format(name, cpu, 100 * cpu / seconds))
+    print(json.dumps({'seconds': seconds, 'cpu': results}))
+
+
+if __name__ == '__main__':
+    main()
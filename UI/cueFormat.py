@@ -0,0 +1,188 @@
+"""
+    Compact binary cue files for deployment to the box
+
+    A cue file holds the effects of one track, in the order export_effects()
+    writes them. Cue times are stored as unsigned LEB128 varints of the delta to
+    the previous cue and effects as one byte indexes into a name table, so a cue
+    usually takes two or three bytes instead of a JSON row of two strings.
+
+    Readers work on any buffer, an mmap of the file included, through a
+    memoryview without copying it. Iterating decodes cues on the fly and only
+    yields the time and the index of the effect; effect names are decoded once.
+
+    File layout (little endian):
+        header  '<4sHHI'  magic, version, effect names, cues
+        names   per name  one byte length, UTF-8 bytes
+        cues    per cue   varint milliseconds since the previous cue, one byte effect index
+
+    Usage: python cueFormat.py encode [Encodings.db|Encodings.json] [out_directory]
+           python cueFormat.py decode [track.cues]
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+
+from operator import itemgetter
+
+from effectTimeline import EffectTimeline, format_timestamp, parse_timestamp
+
+MAGIC = b'CUES'
+VERSION = 1
+HEADER = struct.Struct('<4sHHI')
+MAX_EFFECTS = 256  # Effect indexes are a single byte
+EXTENSION = '.cues'
+
+
+def encode(rows):
+    """ Cue file bytes of [timestamp, effect] rows, e.g. the rows export_effects() stores """
+    cues = sorted(((parse_timestamp(timestamp), effect) for timestamp, effect in rows), key=itemgetter(0))
+    names = list(dict.fromkeys(effect for _, effect in cues))  # First use order
+    if len(names) > MAX_EFFECTS:
+        raise ValueError('A cue file holds at most {} effect types, got {}'.format(MAX_EFFECTS, len(names)))
+    ids = {name: index for index, name in enumerate(names)}
+
+    data = bytearray(HEADER.pack(MAGIC, VERSION, len(names), len(cues)))
+    for name in names:
+        encoded = name.encode('utf-8')
+        if len(encoded) > 255:
+            raise ValueError('Effect name too long for a cue file: {}'.format(name))
+        data.append(len(encoded))
+        data += encoded
+    previous = 0
+    for time, effect in cues:
+        delta = time - previous
+        if delta < 0:
+            raise ValueError('Cue times must not be negative: {}'.format(time))
+        previous = time
+        while delta >= 0x80:
+            data.append(delta & 0x7F | 0x80)
+            delta >>= 7
+        data.append(delta)
+        data.append(ids[effect])
+    return bytes(data)
+
+
+class CueReader:
+    """ Zero-copy reader of a cue file in `buffer` (bytes, bytearray or mmap) """
+
+    def __init__(self, buffer):
+        self.view = memoryview(buffer)
+        if len(self.view) < HEADER.size:
+            raise ValueError('Not a cue file, too short')
+        magic, version, name_count, self.count = HEADER.unpack_from(self.view)
+        if magic != MAGIC:
+            raise ValueError('Not a cue file')
+        if version != VERSION:
+            raise ValueError('Unsupported cue file version {}'.format(version))
+        offset = HEADER.size
+        self.names = []
+        for _ in range(name_count):
+            length = self.view[offset]
+            self.names.append(str(self.view[offset + 1:offset + 1 + length], 'utf-8'))
+            offset += 1 + length
+        self.data_offset = offset
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """ (milliseconds, effect index) of every cue, decoded straight from the buffer """
+        view = self.view
+        offset = self.data_offset
+        time = 0
+        for _ in range(self.count):
+            shift = 0
+            byte = view[offset]
+            delta = byte & 0x7F
+            while byte & 0x80:
+                offset += 1
+                shift += 7
+                byte = view[offset]
+                delta |= (byte & 0x7F) << shift
+            time += delta
+            yield time, view[offset + 1]
+            offset += 2
+
+    def cues(self):
+        """ (milliseconds, effect name) of every cue, the names are shared, not decoded per cue """
+        names = self.names
+        for time, effect in self:
+            yield time, names[effect]
+
+    def to_timeline(self):
+        """ EffectTimeline of the cues, filled without intermediate lists """
+        timeline = EffectTimeline()
+        times, ids = timeline.times, timeline.ids
+        registry_ids = [timeline.registry.intern(name) for name in self.names]  # File index -> registry ID
+        for time, effect in self:
+            times.append(time)
+            ids.append(registry_ids[effect])
+        return timeline
+
+    def to_rows(self):
+        """ [timestamp, effect] rows exactly as export_effects() produces them """
+        return [[format_timestamp(time), effect] for time, effect in self.cues()]
+
+    def release(self):
+        self.view.release()
+
+
+class CueFile(CueReader):
+    """ Cue file on disk, memory mapped for as long as it is open """
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        super().__init__(self.map)
+
+    def close(self):
+        self.release()
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_cues(path, rows):
+    """ Write the cue file of one track through a temp file, returns its size """
+    data = encode(rows)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+    return len(data)
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == 'encode':
+        from encodingStore import open_store
+        store = open_store(sys.argv[2])
+        os.makedirs(sys.argv[3], exist_ok=True)
+        tracks = json_bytes = cue_bytes = 0
+        for key, rows in store.items():
+            path = os.path.join(sys.argv[3], key + EXTENSION)
+            cue_bytes += write_cues(path, rows)
+            json_bytes += len(json.dumps(rows, indent=4))
+            tracks += 1
+            with CueFile(path) as cues:  # Every file must read back as the rows export_effects() would store
+                if cues.to_rows() != EffectTimeline.from_rows(rows).to_json():
+                    raise ValueError('Cue file of {} does not round-trip'.format(key))
+        store.close()
+        print("Encoded {} tracks: {} bytes of JSON as {} bytes of cues".format(tracks, json_bytes, cue_bytes))
+    elif len(sys.argv) == 3 and sys.argv[1] == 'decode':
+        with CueFile(sys.argv[2]) as cues:
+            print(json.dumps(cues.to_rows(), indent=4))
+    else:
+        print("Usage: python cueFormat.py encode [Encodings.db|Encodings.json] [out_directory]")
+        print("       python cueFormat.py decode [track.cues]")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+    Dispatch jitter harness with a simulated player clock
+
+    Replays a timeline through EffectDispatcher against a simulated player whose
+    get_time() only advances in coarse steps, like VLC's. Each emitted cue is
+    compared with the simulated true playback time, so dispatch latency and jitter
+    can be measured without audio hardware.
+
+    Usage: python dispatchHarness.py [seconds] [update_ms]
+"""
+import random
+import sys
+import time
+
+from effectDispatcher import CallbackOutput, EffectDispatcher, LatencyHistogram
+from effectTimeline import EffectTimeline, parse_timestamp
+from playbackClock import PlaybackClock
+
+# The dense 10:05-10:07 cluster from sample2.mp3 in Encodings.json
+SAMPLE_CUES = [['10:05:012', 'Affect3'], ['10:06:723', 'Affect2'], ['10:07:112', 'Affect2'], ['10:07:495', 'Affect2']]
+
+
+class SimulatedPlayer:
+    """ Stand-in for vlc.MediaPlayer that plays in real time from `start_ms` """
+
+    def __init__(self, start_ms=0, update_ms=50, jitter_ms=5):
+        self.start_ms = start_ms
+        self.update_ms = update_ms  # How often the reported time moves on
+        self.jitter_ms = jitter_ms  # Random delay of each reported update
+        self.started = time.perf_counter()
+
+    def true_time(self):
+        """ Exact playback position in milliseconds """
+        return self.start_ms + (time.perf_counter() - self.started) * 1000
+
+    def is_playing(self):
+        return True
+
+    def get_time(self):
+        delayed = self.true_time() - random.uniform(0, self.jitter_ms)
+        return int(delayed // self.update_ms * self.update_ms)
+
+
+def burst_timeline(start_ms, seconds, rng):
+    """ Sample cues plus random bursts of cues a few milliseconds apart """
+    timeline = EffectTimeline.from_rows(SAMPLE_CUES)
+    cue = start_ms + 200
+    while cue < start_ms + seconds * 1000:
+        for _ in range(rng.randint(2, 8)):
+            timeline.add(cue, 'Affect{}'.format(rng.randint(1, 3)))
+            cue += rng.randint(1, 15)
+        cue += rng.randint(50, 400)
+    return timeline
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    update_ms = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    start_ms = parse_timestamp(SAMPLE_CUES[0][0]) - 500
+    player = SimulatedPlayer(start_ms=start_ms, update_ms=update_ms)
+    timeline = burst_timeline(start_ms, seconds, random.Random(69))
+
+    true_latency = LatencyHistogram()
+    output = CallbackOutput(lambda cue_time, effect: true_latency.record(player.true_time() - cue_time))
+    dispatcher = EffectDispatcher(PlaybackClock(player), [output], timeline)
+    dispatcher.start()
+    time.sleep(seconds)
+    dispatcher.stop()
+
+    print('Cues in timeline: {}'.format(len(timeline.between(start_ms, start_ms + int(seconds * 1000)))))
+    print('Latency against the dispatcher clock: {}'.format(dispatcher.histogram.summary()))
+    print('Latency against true playback time: {}'.format(true_latency.summary()))
+    print(true_latency)
+
+
+if __name__ == '__main__':
+    main()
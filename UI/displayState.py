@@ -0,0 +1,85 @@
+"""
+    Cached time display for the player window
+
+    Every refresh tick reads VLC's clock once, reuses the media length cached for
+    the current track and only pushes a widget update when the rendered text or
+    slider position differs from what is already on screen. Counters for libvlc
+    calls and widget updates make the savings measurable.
+"""
+import time
+
+from effectTimeline import format_timestamp
+
+SLIDER_STEPS = 10000  # Matches the 0.0001 resolution of the TIME slider
+
+
+class TrackDisplay:
+    """ Elapsed time, total time and slider position of the current track """
+
+    def __init__(self, window, player, clock=None, stats_interval=None):
+        self.window = window
+        self.player = player
+        self.clock = clock  # PlaybackClock fed with every get_time() reading, if given
+        self.length = None  # Media length in milliseconds, cached once VLC knows it
+        self.rendered = {}  # Element key -> value currently shown
+        self.stats_interval = stats_interval  # Seconds between printed counter rates, None to stay quiet
+        self.libvlc_calls = 0
+        self.widget_updates = 0
+        self.stats_started = time.monotonic()
+
+    def set_media(self):
+        """ Forget the cached length when a new track is loaded """
+        self.length = None
+        self.reset()
+
+    def reset(self):
+        """ Show the start of the track """
+        self.show('TIME_ELAPSED', '00:00:00')
+        self.show('TIME', 0)
+
+    def show(self, key, value):
+        """ Push `value` to the element only when it is not already shown """
+        if self.rendered.get(key) == value:
+            return
+        self.rendered[key] = value
+        if key == 'TIME':
+            self.window[key].update(value=value)
+        else:
+            self.window[key].update(value)
+        self.widget_updates += 1
+
+    def tick(self, playing):
+        """ Refresh the display from a single read of the playback clock """
+        if playing:
+            elapsed = self.player.get_time()
+            counter_ns = time.perf_counter_ns()
+            self.libvlc_calls += 1
+            if self.clock is not None:
+                self.clock.update(elapsed, counter_ns)
+            if not self.length:
+                self.length = max(0, self.player.get_length())  # 0 until VLC has parsed the media
+                self.libvlc_calls += 1
+
+            self.show('TIME_TOTAL', format_timestamp(self.length))
+            self.seek(elapsed)
+        self.report()
+
+    def seek(self, elapsed):
+        """ Show a position the player was just moved to, without asking VLC for it """
+        self.show('TIME_ELAPSED', format_timestamp(elapsed))
+        if self.length:
+            self.show('TIME', round(elapsed / self.length * SLIDER_STEPS) / SLIDER_STEPS)
+
+    def rates(self):
+        """ libvlc calls and widget updates per second since the last reset of the counters """
+        elapsed = max(1e-9, time.monotonic() - self.stats_started)
+        return {'libvlc_calls': self.libvlc_calls / elapsed, 'widget_updates': self.widget_updates / elapsed}
+
+    def report(self):
+        """ Print and restart the counters every `stats_interval` seconds """
+        if self.stats_interval is None or time.monotonic() - self.stats_started < self.stats_interval:
+            return
+        print('display: {libvlc_calls:.1f} libvlc calls/s, {widget_updates:.1f} widget updates/s'.format(
+            **self.rates()))
+        self.libvlc_calls = self.widget_updates = 0
+        self.stats_started = time.monotonic()
@@ -0,0 +1,190 @@
+"""
+    Real-time effect dispatch during playback
+
+    EffectDispatcher runs on its own thread, follows a PlaybackClock and emits
+    every cue of an EffectTimeline to a set of outputs as soon as its timestamp is
+    reached. It sleeps until the next cue is due and spins for the last couple of
+    milliseconds, so a cue fires within a bounded latency even in dense bursts.
+    Seeking backwards or jumping forward re-syncs the dispatcher without replaying
+    the cues in between. Every dispatch is recorded in a latency histogram.
+    Due cues are copied under the timeline's lock, so edits made on the GUI
+    thread meanwhile never shift the cues under the dispatcher. While nothing
+    plays the thread blocks until wake() is called, e.g. when VLC starts
+    playing, and only checks the clock every IDLE_MS in case a wake is missed.
+"""
+import json
+import socket
+import sys
+import threading
+import time
+
+SPIN_MS = 2  # Busy wait this long before a cue instead of trusting sleep()
+IDLE_MS = 1000  # Clock polling interval while nothing is playing, wake() starts dispatching at once
+MAX_SLEEP_MS = 10  # Upper bound on a sleep while playing, so seeks and edits are picked up quickly
+RESYNC_MS = 500  # A forward jump larger than this is treated as a seek
+
+
+class CallbackOutput:
+    """ Calls `callback(time, effect)` for every dispatched cue """
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def emit(self, cue_time, effect):
+        self.callback(cue_time, effect)
+
+    def close(self):
+        pass
+
+
+class StdoutOutput:
+    """ Prints every dispatched cue on its own line """
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def emit(self, cue_time, effect):
+        self.stream.write('{} {}\n'.format(cue_time, effect))
+        self.stream.flush()
+
+    def close(self):
+        pass
+
+
+class SocketOutput:
+    """ Sends every dispatched cue as a JSON datagram to a local UDP socket """
+
+    def __init__(self, host='127.0.0.1', port=6969):
+        self.address = (host, port)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def emit(self, cue_time, effect):
+        message = json.dumps({'time': cue_time, 'effect': effect}).encode()
+        try:
+            self.socket.sendto(message, self.address)
+        except OSError:
+            pass  # Nobody listening, the cue is dropped like any other datagram
+
+    def close(self):
+        self.socket.close()
+
+
+class LatencyHistogram:
+    """ Fixed bucket histogram of dispatch latencies in milliseconds """
+
+    def __init__(self, bucket_ms=1.0, buckets=50):
+        self.bucket_ms = bucket_ms
+        self.counts = [0] * (buckets + 1)  # The last bucket collects everything above the range
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def record(self, latency):
+        latency = max(0.0, latency)
+        self.counts[min(int(latency / self.bucket_ms), len(self.counts) - 1)] += 1
+        self.count += 1
+        self.total += latency
+        self.maximum = max(self.maximum, latency)
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percent):
+        """ Upper bound of the bucket holding the given percentile """
+        target = self.count * percent / 100
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return (index + 1) * self.bucket_ms
+        return 0.0
+
+    def summary(self):
+        return {'count': self.count, 'mean': round(self.mean(), 3), 'p50': self.percentile(50),
+                'p99': self.percentile(99), 'max': round(self.maximum, 3)}
+
+    def __str__(self):
+        lines = []
+        peak = max(self.counts) or 1
+        for index, count in enumerate(self.counts):
+            if count:
+                label = '>{:g}'.format(index * self.bucket_ms) if index == len(self.counts) - 1 else \
+                    '{:g}-{:g}'.format(index * self.bucket_ms, (index + 1) * self.bucket_ms)
+                lines.append('{:>10} ms {:>7} {}'.format(label, count, '#' * max(1, 40 * count // peak)))
+        return '\n'.join(lines)
+
+
+class EffectDispatcher:
+    """ Fires the cues of a timeline on their timestamps while the clock runs """
+
+    def __init__(self, clock, outputs, timeline=None, skip=()):
+        self.clock = clock
+        self.outputs = list(outputs)
+        self.timeline = timeline
+        self.skip = frozenset(skip)  # Effect names that are never dispatched, e.g. unaccepted suggestions
+        self.histogram = LatencyHistogram()
+        self.position = None  # Cues up to and including this time have been dispatched
+        self.running = threading.Event()
+        self.wakeup = threading.Event()  # Set by wake() to end an idle wait
+        self.thread = None
+
+    def set_timeline(self, timeline):
+        """ Switch to the timeline of a newly loaded track """
+        self.timeline = timeline
+        self.position = None
+        self.wake()
+
+    def wake(self):
+        """ Check the clock now instead of after the idle interval, call when playback starts """
+        self.wakeup.set()
+
+    def start(self):
+        self.running.set()
+        self.thread = threading.Thread(target=self.run, name='EffectDispatcher', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running.clear()
+        self.wake()
+        if self.thread:
+            self.thread.join()
+        for output in self.outputs:
+            output.close()
+
+    def run(self):
+        while self.running.is_set():
+            delay = self.step()
+            if delay is None:
+                self.wakeup.wait(IDLE_MS / 1000)  # Nothing plays, no libvlc calls until woken
+                self.wakeup.clear()
+            elif delay > SPIN_MS:
+                time.sleep(min(delay - SPIN_MS, MAX_SLEEP_MS) / 1000)
+            elif delay > 0:
+                time.sleep(0)  # Yield while spinning towards the cue
+
+    def step(self):
+        """ Dispatch the cues that are due, returns the milliseconds until the next one, None while idle """
+        now = self.clock.now()
+        timeline = self.timeline
+        if now is None or timeline is None:
+            self.position = None
+            return None
+        now = int(now)
+        if self.position is None or now < self.position or now - self.position > RESYNC_MS:
+            self.position = now - 1  # Started or seeked, only fire cues from here on
+
+        with timeline.lock:
+            first, last = timeline.index_range(self.position + 1, now + 1)
+            cues = [timeline[index] for index in range(first, last)]
+            next_time = timeline.time_at(last) if last < len(timeline) else None
+        for cue_time, effect in cues:
+            if effect in self.skip:
+                continue
+            self.histogram.record(now - cue_time)
+            for output in self.outputs:
+                output.emit(cue_time, effect)
+        self.position = now
+
+        if next_time is not None:
+            return next_time - now
+        return MAX_SLEEP_MS
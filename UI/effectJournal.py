@@ -0,0 +1,193 @@
+"""
+    Autosave journal of effect edits
+
+    Every effect added or removed is appended to a per track journal file as one
+    JSON line, flushed to the OS at once and fsynced in batches by a background
+    thread SYNC_MS after the first unsynced edit. The thread sleeps while there
+    is nothing to sync. Nothing is rewritten on a keypress, so the
+    journal is cheap enough to write on every tap. A process crash loses nothing
+    and a power cut at most the last SYNC_MS of edits.
+
+    When a track is loaded again its journal is replayed on top of the stored
+    encoding. Replaying is idempotent, an add of a cue that is already there or
+    a remove of one that is gone is skipped, so a journal replayed over an
+    export that already contains its edits changes nothing. Once an export has
+    been written the journal is compacted to the edits made since.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+JOURNAL_DIRNAME = 'Journals'
+SYNC_MS = 250  # Longest time an edit stays in the OS cache before it is fsynced
+
+
+def journal_key(filename):
+    """ File name of the journal of a track, safe on every file system """
+    return hashlib.blake2b(filename.encode('utf-8'), digest_size=10).hexdigest() + '.journal'
+
+
+def find_cue(timeline, time, effect):
+    """ Index of a cue with exactly this time and effect, None if there is none """
+    index = timeline.next_index(time)
+    while index < len(timeline) and timeline.time_at(index) == time:
+        if timeline.effect_at(index) == effect:
+            return index
+        index += 1
+    return None
+
+
+def replay(timeline, operations):
+    """ Apply journaled operations to `timeline`, returns how many changed it """
+    changed = 0
+    for kind, time, effect in operations:
+        index = find_cue(timeline, time, effect)
+        if kind == 'add' and index is None:
+            timeline.add(time, effect)
+        elif kind == 'remove' and index is not None:
+            timeline.remove(index)
+        else:
+            continue
+        changed += 1
+    return changed
+
+
+class EffectJournal:
+    """ Append-only journal of the track that is currently loaded """
+
+    def __init__(self, directory, sync_ms=SYNC_MS):
+        self.directory = directory
+        self.filename = None  # Track whose journal is open
+        self.file = None
+        self.dirty = False  # Written since the last fsync
+        self.lock = threading.Lock()  # Shared with the sync thread
+        self.changed = threading.Condition(self.lock)  # Notified when the journal becomes dirty or is closed
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, args=(sync_ms / 1000,), daemon=True)
+        self.thread.start()
+
+    def path(self, filename):
+        return os.path.join(self.directory, journal_key(filename))
+
+    def read(self, filename):
+        """ Journaled operations of a track, a line torn by a crash is skipped """
+        operations = []
+        try:
+            with open(self.path(filename), encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        operations.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            pass
+        return operations
+
+    def append_file(self, filename):
+        """ Open a journal for appending, ending a line torn by a crash so the next edit starts afresh """
+        f = open(self.path(filename), 'a+', encoding='utf-8')
+        if f.tell() > 0:
+            f.seek(f.tell() - 1)
+            if f.read(1) != '\n':
+                f.write('\n')
+        return f
+
+    def open(self, filename):
+        """ Start journaling `filename`, returns the operations to replay on its stored encoding """
+        operations = self.read(filename)
+        os.makedirs(self.directory, exist_ok=True)
+        with self.lock:
+            self.close_file()
+            self.filename = filename
+            self.file = self.append_file(filename)
+        return operations
+
+    def append(self, *operation):
+        """ Journal one operation, it survives a crash of the process as soon as this returns """
+        if self.file is None:
+            return
+        with self.lock:
+            self.file.write(json.dumps(operation) + '\n')
+            self.file.flush()
+            if not self.dirty:
+                self.dirty = True
+                self.changed.notify()
+
+    def add(self, time, effect):
+        self.append('add', time, effect)
+
+    def remove(self, time, effect):
+        self.append('remove', time, effect)
+
+    def offset(self):
+        """ Size of the open journal, everything before it is part of an export made now """
+        with self.lock:
+            return self.file.tell() if self.file is not None else 0
+
+    def compact(self, filename, offset):
+        """ Drop the first `offset` bytes of a journal once the export that contains them was written """
+        path = self.path(filename)
+        with self.lock:
+            current = filename == self.filename and self.file is not None
+            if current:
+                self.close_file()
+            try:
+                with open(path, 'rb') as f:
+                    f.seek(offset)
+                    tail = f.read()
+                if tail:
+                    fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+                    with os.fdopen(fd, 'wb') as f:
+                        f.write(tail)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(temp_path, path)
+                else:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+            if current:
+                self.filename = filename
+                self.file = self.append_file(filename)
+
+    def sync(self):
+        """ Fsync the open journal if it was written since the last sync, the lock must be held """
+        if self.dirty and self.file is not None:
+            os.fsync(self.file.fileno())
+            self.dirty = False
+
+    def run(self, interval):
+        """ Sync thread, batches the fsyncs of all edits made within `interval` seconds of the first one """
+        with self.changed:
+            while not self.stopped:
+                if not self.dirty:
+                    self.changed.wait()
+                    continue
+                deadline = time.monotonic() + interval
+                remaining = interval
+                while remaining > 0 and not self.stopped:
+                    self.changed.wait(remaining)
+                    remaining = deadline - time.monotonic()
+                self.sync()
+
+    def close_file(self):
+        """ Sync and close the open journal, the lock must be held """
+        if self.file is not None:
+            self.file.flush()
+            if self.dirty:
+                os.fsync(self.file.fileno())
+                self.dirty = False
+            self.file.close()
+        self.file = None
+        self.filename = None
+
+    def close(self):
+        with self.changed:
+            self.stopped = True
+            self.changed.notify()
+        self.thread.join()
+        with self.lock:
+            self.close_file()
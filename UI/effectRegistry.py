@@ -0,0 +1,140 @@
+"""
+    Registry of effect types
+
+    Effect types are defined in Effects.json next to the application, each with
+    a small integer ID, a name, a display colour, an optional hotkey and free
+    form parameters for the box. Timelines keep only the ID of each cue, so a
+    cue costs two bytes of effect instead of a reference to a name string, and
+    the vocabulary grows by editing the config instead of the code.
+
+    Names that are not configured, e.g. from encodings made with an older
+    vocabulary or the 'Suggested' placeholder, are interned on first sight with
+    the next free ID and a neutral colour, so every stored encoding still loads.
+    Configuring again, e.g. when another window loads Effects.json, keeps every
+    ID that is not redefined, so timelines built before keep resolving.
+    Timelines are built on the GUI thread and on the prefetch worker, so
+    registering is done under a lock; lookups of registered IDs are not.
+
+    Effects.json:
+        {"effects": [{"id": 1, "name": "Affect1", "color": "#E74C3C", "key": "1", "params": {}}, ...]}
+"""
+import json
+import threading
+
+CONFIG_FILENAME = 'Effects.json'
+MAX_ID = 0xFFFF  # IDs are stored in array('H')
+DEFAULT_COLOR = '#808080'  # Colour of interned names without a configured type
+
+DEFAULT_EFFECTS = [
+    {'id': 1, 'name': 'Affect1', 'color': '#E74C3C', 'key': '1', 'params': {}},
+    {'id': 2, 'name': 'Affect2', 'color': '#3498DB', 'key': '2', 'params': {}},
+    {'id': 3, 'name': 'Affect3', 'color': '#F1C40F', 'key': '3', 'params': {}},
+]
+
+
+class EffectType:
+    """ One configured or interned effect type """
+
+    __slots__ = ('id', 'name', 'color', 'key', 'params', 'configured')
+
+    def __init__(self, effect_id, name, color=DEFAULT_COLOR, key=None, params=None, configured=True):
+        self.id = effect_id
+        self.name = name
+        self.color = color
+        self.key = key  # Hotkey character, None for none
+        self.params = params or {}
+        self.configured = configured  # False for names interned from encodings
+
+
+class EffectRegistry:
+    """ Effect types by ID and by name """
+
+    def __init__(self, definitions=DEFAULT_EFFECTS):
+        self.lock = threading.RLock()  # Guards registering, configure() registers through add()
+        self.configure(definitions)
+
+    def configure(self, definitions):
+        """ Replace the registered types with `definitions`, dicts as found in Effects.json.
+            Raises ValueError or KeyError for invalid definitions and keeps the registered types then. """
+        effect_types = []
+        ids, names = set(), set()
+        for definition in definitions:
+            effect_id = int(definition['id'])
+            if not 0 <= effect_id <= MAX_ID:
+                raise ValueError('Effect ID out of range: {}'.format(effect_id))
+            if effect_id in ids or definition['name'] in names:
+                raise ValueError('Effect defined twice: {} {}'.format(effect_id, definition['name']))
+            ids.add(effect_id)
+            names.add(definition['name'])
+            effect_types.append(EffectType(effect_id, definition['name'], definition.get('color', DEFAULT_COLOR),
+                                           definition.get('key'), definition.get('params')))
+        with self.lock:
+            previous = list(getattr(self, 'by_id', {}).values())
+            self.by_id = {}
+            self.by_name = {}
+            self.names = []  # ID -> name, None for unused IDs, indexed on every cue lookup
+            for effect_type in effect_types:
+                self.add(effect_type)
+            # Timelines built before keep their IDs, so every ID that is not redefined keeps resolving
+            for effect_type in previous:
+                if effect_type.id in self.by_id:
+                    continue
+                kept = EffectType(effect_type.id, effect_type.name, effect_type.color, configured=False)
+                if effect_type.name in self.by_name:
+                    self.by_id[kept.id] = kept  # Configured under another ID now, only looked up by the old ID
+                    self.set_name(kept)
+                else:
+                    self.add(kept)
+
+    def load(self, path):
+        """ Configure from an Effects.json file, keeping the defaults if there is none or it is invalid """
+        try:
+            with open(path) as f:
+                self.configure(json.load(f)['effects'])
+        except FileNotFoundError:
+            return
+        except (ValueError, KeyError, TypeError) as e:  # Malformed JSON or definitions
+            print('Ignoring {}, using the default effects: {!r}'.format(path, e))
+
+    def add(self, effect_type):
+        with self.lock:
+            self.by_id[effect_type.id] = effect_type
+            self.by_name[effect_type.name] = effect_type
+            self.set_name(effect_type)
+
+    def set_name(self, effect_type):
+        if effect_type.id >= len(self.names):
+            self.names.extend([None] * (effect_type.id + 1 - len(self.names)))
+        self.names[effect_type.id] = effect_type.name
+
+    def intern(self, name):
+        """ ID of the effect called `name`, registering it if it is not configured """
+        effect_type = self.by_name.get(name)
+        if effect_type is None:
+            with self.lock:
+                effect_type = self.by_name.get(name)  # Another thread may have registered it meanwhile
+                if effect_type is None:
+                    effect_id = len(self.names)
+                    if effect_id > MAX_ID:
+                        raise ValueError('Too many effect types, cannot intern {}'.format(name))
+                    effect_type = EffectType(effect_id, name, configured=False)
+                    self.add(effect_type)
+        return effect_type.id
+
+    def name(self, effect_id):
+        return self.names[effect_id]
+
+    def color(self, effect_id):
+        return self.by_id[effect_id].color
+
+    def configured(self):
+        """ Configured effect types in ID order, the vocabulary offered to the operator """
+        return sorted((effect_type for effect_type in self.by_id.values() if effect_type.configured),
+                      key=lambda effect_type: effect_type.id)
+
+    def keymap(self):
+        """ Hotkey character -> effect name of every configured type with a key """
+        return {effect_type.key: effect_type.name for effect_type in self.configured() if effect_type.key}
+
+
+REGISTRY = EffectRegistry()  # Process wide registry, configured by the application at startup
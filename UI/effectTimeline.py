@@ -0,0 +1,135 @@
+"""
+    Sorted effect timeline for a single track
+
+    Cue times are kept as integer milliseconds in a compact array that is always
+    sorted, with the effect type IDs from the effect registry in a parallel
+    array, so a cue takes ten bytes no matter how long its effect name is.
+    Lookups by time use bisect, so finding the next/previous cue or all cues in
+    a window is O(log n). The timeline converts to and from the [["MM:SS:mmm", "Effect"], ...] rows used by
+    the effects table and the encoding store.
+
+    The GUI thread edits a timeline while the dispatcher thread reads it, so
+    edits and multi-step reads from other threads go through `lock`.
+"""
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+from effectRegistry import REGISTRY
+
+
+def parse_timestamp(timestamp):
+    """ Convert a "MM:SS:mmm" timestamp to milliseconds """
+    minutes, seconds, milliseconds = map(int, timestamp.split(':'))
+    return (minutes * 60 + seconds) * 1000 + milliseconds
+
+
+def format_timestamp(milliseconds):
+    """ Convert milliseconds to a "MM:SS:mmm" timestamp """
+    return "{:02d}:{:02d}:{:03d}".format(*divmod(milliseconds // 1000, 60), milliseconds % 1000)
+
+
+class EffectTimeline:
+    """ Effects of a track ordered by time """
+
+    registry = REGISTRY  # Maps effect names to the IDs kept per cue
+
+    def __init__(self):
+        self.times = array('q')  # Cue times in milliseconds, ascending
+        self.ids = array('H')  # Effect type ID of each cue, parallel to `times`
+        self.lock = threading.Lock()  # Held by edits and by readers on other threads
+
+    @classmethod
+    def from_rows(cls, rows):
+        """ Build a timeline from [timestamp, effect] rows in any order """
+        return cls.from_cues((parse_timestamp(timestamp), effect) for timestamp, effect in rows)
+
+    @classmethod
+    def from_cues(cls, cues):
+        """ Build a timeline from (milliseconds, effect) pairs in any order """
+        timeline = cls()
+        cues = sorted(cues, key=lambda cue: cue[0])
+        timeline.times = array('q', (time for time, _ in cues))
+        timeline.ids = array('H', map(timeline.registry.intern, (effect for _, effect in cues)))
+        return timeline
+
+    @property
+    def effects(self):
+        """ Effect names of all cues, built on every access, use effect_at() for a single cue """
+        return list(map(self.registry.name, self.ids))
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self, index):
+        return self.times[index], self.registry.name(self.ids[index])
+
+    def __iter__(self):
+        return zip(self.times, map(self.registry.name, self.ids))
+
+    def add(self, time, effect):
+        """ Insert a cue after any cues at the same time, returns its index """
+        effect_id = self.registry.intern(effect)
+        with self.lock:
+            index = bisect_right(self.times, time)
+            self.times.insert(index, time)
+            self.ids.insert(index, effect_id)
+        return index
+
+    def remove(self, index):
+        """ Remove the cue at `index` """
+        with self.lock:
+            del self.times[index]
+            del self.ids[index]
+
+    def set_effect(self, index, effect):
+        """ Change the effect of the cue at `index`, its time and position stay the same """
+        effect_id = self.registry.intern(effect)
+        with self.lock:
+            self.ids[index] = effect_id
+
+    def effect_at(self, index):
+        """ Effect name of the cue at `index` """
+        return self.registry.name(self.ids[index])
+
+    def time_at(self, index):
+        """ Time in milliseconds of the cue at `index` """
+        return self.times[index]
+
+    def next_index(self, time):
+        """ Index of the first cue at or after `time`, len(self) if there is none """
+        return bisect_left(self.times, time)
+
+    def next_effect(self, time):
+        """ First (time, effect) at or after `time`, or None """
+        index = bisect_left(self.times, time)
+        return self[index] if index < len(self.times) else None
+
+    def previous_effect(self, time):
+        """ Last (time, effect) strictly before `time`, or None """
+        index = bisect_left(self.times, time)
+        return self[index - 1] if index > 0 else None
+
+    def index_range(self, start, end):
+        """ (first, last) index slice of the cues with start <= time < end """
+        return bisect_left(self.times, start), bisect_left(self.times, end)
+
+    def between(self, start, end):
+        """ List of (time, effect) cues with start <= time < end """
+        first, last = self.index_range(start, end)
+        return list(zip(self.times[first:last], map(self.registry.name, self.ids[first:last])))
+
+    def row(self, index):
+        """ Table row for the cue at `index` """
+        return [format_timestamp(self.times[index]), self.effect_at(index)]
+
+    def rows(self, start=0, end=None):
+        """ Table rows for the cues in index range [start, end) """
+        end = len(self.times) if end is None else end
+        name = self.registry.name
+        return [[format_timestamp(time), name(effect_id)] for time, effect_id in
+                zip(self.times[start:end], self.ids[start:end])]
+
+    def to_json(self):
+        """ Effects in the Encodings.json [[timestamp, effect], ...] format """
+        return self.rows()
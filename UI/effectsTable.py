@@ -0,0 +1,180 @@
+"""
+    Effects table backed by an EffectTimeline
+
+    sg.Table.update(values=...) deletes and re-inserts every Treeview row. The
+    model below keeps the table in step with the timeline by inserting or deleting
+    single rows in the underlying Tk Treeview at their sorted position, and only
+    renumbers the rows that moved. Item ids no longer match row numbers after an
+    insert, so selections must be read through selected_rows() rather than from
+    the PySimpleGUI values dict.
+
+    Timelines with VIRTUAL_THRESHOLD or more cues are shown in virtual mode: the
+    Treeview only holds a fixed pool of items for the visible rows plus a small
+    buffer, and scrolling re-fills that pool from the timeline. The scrollbar and
+    mouse wheel are redirected to move the window over the timeline instead. A
+    table that grows to the threshold through insert() switches to virtual mode
+    right away and stays in it until the next load().
+"""
+from effectTimeline import EffectTimeline
+
+VIRTUAL_THRESHOLD = 2000  # Timelines with at least this many cues use the virtual table
+VIRTUAL_BUFFER = 10  # Rows rendered below the visible range in virtual mode
+WHEEL_ROWS = 3  # Rows scrolled per mouse wheel step in virtual mode
+
+
+class EffectsTableModel:
+    """ Keeps an sg.Table (created with display_row_numbers=True) in sync with a timeline """
+
+    def __init__(self, element, timeline=None, virtual_threshold=VIRTUAL_THRESHOLD):
+        self.element = element
+        self.tree = element.Widget
+        self.timeline = timeline if timeline is not None else EffectTimeline()
+        self.iids = []  # Treeview item ids, one per row or one per pooled item in virtual mode
+        self.next_iid = 1
+        self.virtual_threshold = virtual_threshold
+        self.virtual = False
+        self.offset = 0  # Timeline index of the first Treeview item, always 0 outside virtual mode
+
+        # Remember the normal scrolling setup so it can be restored when leaving virtual mode
+        self.scrollbar = getattr(element, 'vsb', None)
+        self.tree_scroll_command = self.tree.cget('yscrollcommand')
+        self.scrollbar_command = self.scrollbar.cget('command') if self.scrollbar else None
+        for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            self.tree.bind(sequence, self.on_wheel, add='+')
+
+    def selected_rows(self):
+        """ Timeline indexes of the selected rows, in table order """
+        return sorted(self.offset + self.tree.index(iid) for iid in self.tree.selection())
+
+    def new_iid(self):
+        iid = str(self.next_iid)  # PySimpleGUI's selection handler expects numeric item ids
+        self.next_iid += 1
+        return iid
+
+    def values(self, index):
+        return [index + self.element.StartingRowNumber] + self.timeline.row(index)
+
+    def visible_rows(self):
+        return int(self.tree.cget('height'))
+
+    def load(self, timeline):
+        """ Replace the table contents with a whole timeline """
+        self.timeline = timeline
+        self.tree.delete(*self.tree.get_children())
+        self.iids = []
+        self.offset = 0
+        self.set_virtual(len(timeline) >= self.virtual_threshold)
+        if self.virtual:
+            self.element.Values = []  # Rows are paged from the timeline instead
+            self.render()
+            return
+        for index in range(len(timeline)):
+            iid = self.new_iid()
+            self.tree.insert('', 'end', iid=iid, values=self.values(index))
+            self.iids.append(iid)
+        self.element.Values = timeline.rows()
+
+    def insert(self, time, effect):
+        """ Add a cue to the timeline and insert its row at the sorted position """
+        index = self.timeline.add(time, effect)
+        if not self.virtual and len(self.timeline) >= self.virtual_threshold:
+            self.load(self.timeline)  # Grew past the threshold, page the rows from now on
+        if self.virtual:
+            self.show(index)
+            return index
+        iid = self.new_iid()
+        self.tree.insert('', index, iid=iid, values=self.values(index))
+        self.iids.insert(index, iid)
+        self.element.Values.insert(index, self.timeline.row(index))
+        self.renumber(index + 1)
+        self.tree.see(iid)
+        return index
+
+    def remove(self, indexes):
+        """ Remove the cues at the given row indexes """
+        if not indexes:
+            return
+        for index in sorted(indexes, reverse=True):
+            self.timeline.remove(index)
+            if not self.virtual:
+                self.tree.delete(self.iids.pop(index))
+                del self.element.Values[index]
+        if self.virtual:
+            self.render()
+        else:
+            self.renumber(min(indexes))
+
+    def refresh(self, indexes):
+        """ Redraw the given rows after their cues were changed in place """
+        if self.virtual:
+            self.render()
+            return
+        for index in indexes:
+            self.tree.item(self.iids[index], values=self.values(index))
+            self.element.Values[index] = self.timeline.row(index)
+
+    def renumber(self, start):
+        """ Refresh the row number column from `start` to the end of the table """
+        for index in range(start, len(self.iids)):
+            self.tree.set(self.iids[index], column=0, value=index + self.element.StartingRowNumber)
+
+    # Virtual mode
+
+    def set_virtual(self, virtual):
+        """ Route scrolling through the model in virtual mode, or back to the Treeview """
+        self.virtual = virtual
+        if virtual:
+            self.tree.configure(yscrollcommand='')
+            if self.scrollbar:
+                self.scrollbar.configure(command=self.on_scrollbar)
+        else:
+            self.tree.configure(yscrollcommand=self.tree_scroll_command)
+            if self.scrollbar:
+                self.scrollbar.configure(command=self.scrollbar_command)
+
+    def render(self):
+        """ Fill the item pool with the timeline rows starting at `offset` """
+        total = len(self.timeline)
+        pool = min(total, self.visible_rows() + VIRTUAL_BUFFER)
+        while len(self.iids) > pool:
+            self.tree.delete(self.iids.pop())
+        while len(self.iids) < pool:
+            iid = self.new_iid()
+            self.tree.insert('', 'end', iid=iid)
+            self.iids.append(iid)
+        self.offset = max(0, min(self.offset, total - pool))
+        for position, iid in enumerate(self.iids):
+            self.tree.item(iid, values=self.values(self.offset + position))
+        self.tree.yview_moveto(0)
+        if self.scrollbar and total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.visible_rows()) / total))
+
+    def scroll_to(self, offset):
+        """ Show the timeline from row `offset`, the selection does not survive a scroll """
+        if self.tree.selection():
+            self.tree.selection_set(())
+        self.offset = offset
+        self.render()
+
+    def show(self, index):
+        """ Scroll the minimum amount needed for row `index` to be visible """
+        if index < self.offset:
+            self.offset = index
+        elif index >= self.offset + self.visible_rows():
+            self.offset = index - self.visible_rows() + 1
+        self.render()
+
+    def on_scrollbar(self, *args):
+        """ Scrollbar command in virtual mode: ('moveto', fraction) or ('scroll', amount, units|pages) """
+        if args[0] == 'moveto':
+            self.scroll_to(int(float(args[1]) * len(self.timeline)))
+        elif args[0] == 'scroll':
+            step = self.visible_rows() if args[2] == 'pages' else 1
+            self.scroll_to(self.offset + int(args[1]) * step)
+
+    def on_wheel(self, event):
+        if not self.virtual:
+            return None
+        up = event.num == 4 or getattr(event, 'delta', 0) > 0
+        self.scroll_to(self.offset + (-WHEEL_ROWS if up else WHEEL_ROWS))
+        return 'break'
@@ -0,0 +1,351 @@
+"""
+    Storage backends for track encodings
+
+    Encodings are kept per track as a list of [timestamp, effect] rows keyed by
+    filename. The SQLite store indexes tracks by filename and commits each track
+    in its own transaction, so an export only touches the track being saved. The
+    JSON store keeps the original Encodings.json layout for compatibility.
+
+    EncodingCache keeps a process wide filename -> effects dict in front of a
+    store and only re-reads it when the file on disk changes underneath it. It
+    holds each track as cue file bytes (see cueFormat.py), a fraction of the
+    memory of the row lists, and decodes them again on every read.
+
+    Usage: python encodingStore.py import [Encodings.json] [Encodings.db]
+"""
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+
+import cueFormat
+
+JSON_FILENAME = 'Encodings.json'
+DB_FILENAME = 'Encodings.db'
+
+
+class EncodingStore:
+    """ Interface shared by the encoding storage backends """
+
+    def __init__(self, path):
+        self.path = path
+
+    def get(self, filename):
+        """ Return the effects stored for `filename`, or None """
+        raise NotImplementedError
+
+    def put(self, filename, effects):
+        """ Store the effects for `filename`, replacing any previous encoding """
+        raise NotImplementedError
+
+    def put_many(self, entries):
+        """ Store several (filename, effects) pairs """
+        for filename, effects in entries:
+            self.put(filename, effects)
+
+    def delete(self, filename):
+        """ Remove the encoding for `filename` if it exists """
+        raise NotImplementedError
+
+    def delete_many(self, filenames):
+        """ Remove the encodings of several filenames """
+        for filename in filenames:
+            self.delete(filename)
+
+    def items(self):
+        """ Iterate over all (filename, effects) pairs """
+        raise NotImplementedError
+
+    def reload(self):
+        """ Drop any state read from disk so the next access sees external changes """
+        pass
+
+    def __contains__(self, filename):
+        return self.get(filename) is not None
+
+    def __len__(self):
+        return sum(1 for _ in self.items())
+
+    def close(self):
+        pass
+
+
+class JsonEncodingStore(EncodingStore):
+    """ Encodings.json backed store, indexed in memory by filename """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.data = []  # Entries in file order
+        self.index = {}  # filename -> entry
+        self.load()
+
+    def load(self):
+        """ Read the JSON file and rebuild the filename index """
+        try:
+            with open(self.path, 'r') as file:
+                self.data = json.load(file)
+        except FileNotFoundError:
+            self.data = []
+        self.index = {item['filename']: item for item in self.data}
+
+    def reload(self):
+        self.load()
+
+    def get(self, filename):
+        entry = self.index.get(filename)
+        return None if entry is None else entry['effects']
+
+    def put(self, filename, effects):
+        self.put_many([(filename, effects)])
+
+    def put_many(self, entries):
+        for filename, effects in entries:
+            entry = self.index.get(filename)
+            if entry:
+                entry['effects'] = effects
+            else:
+                entry = {'filename': filename, 'effects': effects}
+                self.data.append(entry)
+                self.index[filename] = entry
+        self.save()  # One rewrite for the whole batch
+
+    def delete(self, filename):
+        self.delete_many([filename])
+
+    def delete_many(self, filenames):
+        removed = [self.index.pop(filename) for filename in set(filenames) if filename in self.index]
+        if removed:
+            removed_ids = set(map(id, removed))
+            self.data = [entry for entry in self.data if id(entry) not in removed_ids]
+            self.save()  # One rewrite for the whole batch
+
+    def items(self):
+        return ((item['filename'], item['effects']) for item in self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def save(self):
+        """ Write the file to a temporary sibling and swap it in, so a crash never leaves it half written """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(prefix='.Encodings-', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as file:
+                json.dump(self.data, file, indent=4)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+
+class SqliteEncodingStore(EncodingStore):
+    """ SQLite backed store with one row per track and a primary key on filename """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS encodings ('
+                                'filename TEXT PRIMARY KEY, effects TEXT NOT NULL)')
+        self.connection.commit()
+
+    def get(self, filename):
+        row = self.connection.execute('SELECT effects FROM encodings WHERE filename = ?', (filename,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def put(self, filename, effects):
+        with self.connection:  # One transaction per track
+            self.connection.execute('INSERT OR REPLACE INTO encodings (filename, effects) VALUES (?, ?)',
+                                    (filename, json.dumps(effects)))
+
+    def put_many(self, entries):
+        """ Store several (filename, effects) pairs in a single transaction """
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO encodings (filename, effects) VALUES (?, ?)',
+                                        ((filename, json.dumps(effects)) for filename, effects in entries))
+
+    def delete(self, filename):
+        with self.connection:
+            self.connection.execute('DELETE FROM encodings WHERE filename = ?', (filename,))
+
+    def delete_many(self, filenames):
+        """ Remove several encodings in a single transaction """
+        with self.connection:
+            self.connection.executemany('DELETE FROM encodings WHERE filename = ?',
+                                        ((filename,) for filename in filenames))
+
+    def items(self):
+        for filename, effects in self.connection.execute('SELECT filename, effects FROM encodings'):
+            yield filename, json.loads(effects)
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM encodings').fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+
+def pack(effects):
+    """ Cue file bytes of `effects`, or a copy of the rows if they do not fit the format """
+    try:
+        return cueFormat.encode(effects)
+    except ValueError:  # Malformed timestamp, too many effect types or a name too long
+        return [list(row) for row in effects]
+
+
+def unpack(packed):
+    """ Rows of an entry made by pack(), new lists the caller may edit """
+    if isinstance(packed, bytes):
+        return cueFormat.CueReader(packed).to_rows()
+    return [list(row) for row in packed]
+
+
+class EncodingCache(EncodingStore):
+    """ In-memory filename -> packed effects view of a store, invalidated by the file's mtime and size """
+
+    def __init__(self, store):
+        super().__init__(store.path)
+        self.store = store
+        self.effects = None  # filename -> pack(effects), None until the store has been read
+        self.signature = None
+        self.hits = 0  # Lookups answered from memory
+        self.misses = 0  # Lookups that had to re-read the store
+
+    def refresh(self):
+        """ Re-read the store if it changed on disk since it was last read """
+        signature = file_signature(self.path)
+        if self.effects is not None and signature == self.signature:
+            self.hits += 1
+            return
+        self.misses += 1
+        if self.effects is not None:
+            self.store.reload()
+        self.effects = {filename: pack(effects) for filename, effects in self.store.items()}
+        self.signature = signature
+
+    def get(self, filename):
+        self.refresh()
+        packed = self.effects.get(filename)
+        return None if packed is None else unpack(packed)
+
+    def put(self, filename, effects):
+        self.refresh()
+        self.store.put(filename, effects)
+        self.effects[filename] = pack(effects)
+        self.signature = file_signature(self.path)  # Our own write must not invalidate the cache
+
+    def put_many(self, entries):
+        entries = list(entries)
+        self.refresh()
+        self.store.put_many(entries)
+        for filename, effects in entries:
+            self.effects[filename] = pack(effects)
+        self.signature = file_signature(self.path)
+
+    def delete(self, filename):
+        self.refresh()
+        self.store.delete(filename)
+        self.effects.pop(filename, None)
+        self.signature = file_signature(self.path)
+
+    def delete_many(self, filenames):
+        filenames = list(filenames)
+        self.refresh()
+        self.store.delete_many(filenames)
+        for filename in filenames:
+            self.effects.pop(filename, None)
+        self.signature = file_signature(self.path)
+
+    def absorb(self, entries, before, after, deleted=()):
+        """ Take over a write made through another connection, e.g. by the ExportWriter thread.
+            `before` and `after` are the file signatures around the write; if the cache was not
+            current before it, it is left to re-read the store on the next access. """
+        if self.effects is None or self.signature != before:
+            return
+        for filename, effects in entries.items():
+            self.effects[filename] = pack(effects)
+        for filename in deleted:
+            self.effects.pop(filename, None)
+        self.signature = after
+
+    def items(self):
+        self.refresh()
+        return iter([(filename, unpack(packed)) for filename, packed in self.effects.items()])
+
+    def __len__(self):
+        self.refresh()
+        return len(self.effects)
+
+    def stats(self):
+        """ Hit and miss counters of the cache """
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def close(self):
+        self.store.close()
+
+
+def file_signature(path):
+    """ (mtime, size) of the store file and of its SQLite write-ahead log """
+    signature = []
+    for file_path in (path, path + '-wal'):
+        try:
+            stat = os.stat(file_path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def open_store(path):
+    """ Open the store backend matching the file extension of `path` """
+    if path.lower().endswith('.json'):
+        return JsonEncodingStore(path)
+    return SqliteEncodingStore(path)
+
+
+def import_json(json_path, store):
+    """ Copy every entry of an Encodings.json file into `store`, returns the number of tracks """
+    entries = list(JsonEncodingStore(json_path).items())
+    store.put_many(entries)
+    return len(entries)
+
+
+def open_default_store(directory):
+    """ Open the Encodings.db in `directory`, importing Encodings.json the first time it is created """
+    db_path = os.path.join(directory, DB_FILENAME)
+    json_path = os.path.join(directory, JSON_FILENAME)
+    created = not os.path.exists(db_path)
+    store = SqliteEncodingStore(db_path)
+    if created and os.path.exists(json_path):
+        import_json(json_path, store)
+    return store
+
+
+_CACHES = {}  # Process wide caches keyed by the absolute store path
+
+
+def open_cached_store(directory):
+    """ Return the process wide cached default store for `directory` """
+    db_path = os.path.abspath(os.path.join(directory, DB_FILENAME))
+    if db_path not in _CACHES:
+        _CACHES[db_path] = EncodingCache(open_default_store(directory))
+    return _CACHES[db_path]
+
+
+def main():
+    if len(sys.argv) != 4 or sys.argv[1] != 'import':
+        print("Usage: python encodingStore.py import [Encodings.json] [Encodings.db]")
+        sys.exit(1)
+
+    store = open_store(sys.argv[3])
+    count = import_json(sys.argv[2], store)
+    store.close()
+    print("Imported {} tracks into {}".format(count, sys.argv[3]))
+
+
+if __name__ == '__main__':
+    main()
@@ -5,10 +5,13 @@
 
 """
 import vlc
-import pafy
 import PySimpleGUI as sg
 from sys import platform as PLATFORM
 from os import listdir
+from functools import partial
+
+from playlistLoader import PlaylistLoader, read_playlist, resolve_entry
+from streamCache import StreamCache
 
 PATH = './Assets/'
 BUTTON_DICT = {img[:-4].upper(): PATH + img for img in listdir(PATH)}
@@ -30,6 +33,10 @@ class MediaPlayer:
 
         self.track_cnt = 0  # Count of tracks loaded into `media_list`
         self.track_num = 0  # Index of the track currently playing
+        self.streams = StreamCache()  # Resolved online media, shared by single tracks and playlists
+        self.resolve = partial(resolve_entry, resolve_url=self.streams.resolve)
+        self.playlist_loader = None  # Resolves playlist entries in the background
+        self.playlist_status = ''  # Progress or result of the last playlist load
 
         # Setup GUI window for output of media
         self.theme = theme  # This can be changed, but I'd stick with a dark theme
@@ -104,31 +111,30 @@ class MediaPlayer:
         if track is None:
             return  # User did not provide any information
 
-        try:  # Assume this is an online url and not a file path
-            vid = pafy.new(track)  # Create pafy media object
-            media = self.instance.media_new(vid.getbest().url)  # Get REAL YouTube url
-            # Set meta data for media if available
-            media.set_meta(0, vid.title)
-            media.set_meta(1, vid.author)
-
-        except:  # This is a file path and not an online url
-            media = self.instance.media_new(track)
-            media.set_meta(0, track.replace('\\', '/').split('/').pop())  # filename
-            media.set_meta(1, 'Local Media')  # Default author value for local media
-
-        finally:
-            media.set_meta(10, track)  # Url if online media else use filename
-            self.media_list.add_media(media)
-            self.track_cnt = self.media_list.count()
+        try:
+            resolved = self.resolve(track)  # Online url through pafy, else a file path
+        except Exception as e:  # pafy raises plain Exceptions for unknown videos
+            self.window['INFO'].update('Could not load {}: {}'.format(track, e))
+            return
+        self.add_resolved(resolved)
+        self.window.refresh()
+
+    def add_resolved(self, resolved):
+        """ Add a resolved track to the media list """
+        media = self.instance.media_new(resolved.mrl)
+        media.set_meta(0, resolved.title)
+        media.set_meta(1, resolved.author)
+        media.set_meta(10, resolved.source)  # Url if online media else use filename
+        self.media_list.add_media(media)
+        self.track_cnt = self.media_list.count()
 
-            # Update infobar with added track
-            self.window['INFO'].update(f'Loaded: {media.get_meta(0)}')
-            self.window.read(1)  # refresh the screen
+        # Update infobar with added track
+        self.window['INFO'].update(f'Loaded: {media.get_meta(0)}')
 
-            # Update the track counter
-            if self.track_cnt == 1:
-                self.track_num = 1
-                self.list_player.play()
+        # Start playing the first track, the rest of a playlist may still be resolving
+        if self.track_cnt == 1:
+            self.track_num = 1
+            self.list_player.play()
 
     def get_meta(self, meta_type):
         """ Retrieve saved meta data from tracks in media list """
@@ -141,15 +147,19 @@ class MediaPlayer:
         time_total = "{:02d}:{:02d}".format(*divmod(self.player.get_length() // 1000, 60))
         if self.player.is_playing():
             message = "{}\n{}".format(self.get_meta(1).upper(), self.get_meta(0))
-            self.window['INFO'].update(message)
+            self.window['INFO'].update(self.with_playlist_status(message))
             self.window['TIME_ELAPSED'].update(time_elapsed)
             self.window['TIME'].update(self.player.get_position())
             self.window['TIME_TOTAL'].update(time_total)
             self.window['TRACKS'].update('{} of {}'.format(self.track_num, self.track_cnt))
         elif self.media_list.count() == 0:
-            self.window['INFO'].update('Open a FILE, STREAM, or PLAYLIST to begin')
+            self.window['INFO'].update(self.with_playlist_status('Open a FILE, STREAM, or PLAYLIST to begin'))
         else:
-            self.window['INFO'].update('Press PLAY to Start')
+            self.window['INFO'].update(self.with_playlist_status('Press PLAY to Start'))
+
+    def with_playlist_status(self, message):
+        """ Add the playlist loading status below an info message """
+        return '{}\n{}'.format(message, self.playlist_status) if self.playlist_status else message
 
     def play(self):
         """ Called when the play button is pressed """
@@ -206,39 +216,41 @@ class MediaPlayer:
             return
         else:
             self.window['INFO'].update('Loading media...')
-            self.window.read(1)
+            self.window.refresh()  # read() would swallow playlist events posted meanwhile
             self.add_media(track)
         if self.media_list.count() > 0:
             self.play()
 
     def load_playlist_from_file(self):
         """ Open text file and load to new media list. Assumes `playlist.txt` is in root directory """
+        if self.playlist_loader is not None and self.playlist_loader.is_running():
+            return  # Still loading the last playlist
 
         # Read contents of playlist file
-        with open('./playlist.txt', 'r') as f:
-            try:
-                playlist = f.read().splitlines()
-            except IOError:
-                sg.popup_error('There was an error opening the file. Please make sure `playlist.txt` is in\
-                the same path as the media player executable', title='Playlist Error')
-                return
-
-        # Send message to window and update
-        self.window['INFO'].update('Loading playlist...')
-        self.window.read(1)
-
-        # Add each track to the playlist if a valid url or file path
-        for track in playlist:
-            if track.strip():
-                self.add_media(track.replace('\\', '/'))
-
-                # Play this track if player not playing (allows for faster perceived startup)
-                if not self.player.is_playing:
-                    self.play()
-
-        # Increment the track counter
-        self.track_cnt = self.media_list.count()
-        self.track_num = 1
+        try:
+            playlist = read_playlist('./playlist.txt')
+        except IOError:
+            sg.popup_error('There was an error opening the file. Please make sure `playlist.txt` is in\
+            the same path as the media player executable', title='Playlist Error')
+            return
+
+        # Resolve the entries in the background, they are added in order as they are ready
+        self.playlist_status = 'Loading playlist: 0 of {}'.format(len(playlist))
+        self.playlist_loader = PlaylistLoader(playlist, self.window, resolve=self.resolve).start()
+
+    def add_playlist_item(self, index, resolved, error):
+        """ Called for every playlist entry, in playlist order """
+        if resolved is not None:
+            self.add_resolved(resolved)
+
+    def show_playlist_progress(self, resolved, total):
+        self.playlist_status = 'Loading playlist: {} of {}'.format(resolved, total)
+
+    def finish_playlist(self, loaded, failures):
+        """ Report the playlist result, failed entries are listed on the console """
+        self.playlist_status = 'Playlist: {} loaded, {} failed'.format(loaded, len(failures))
+        for entry, error in failures:
+            print('Could not load {}: {}'.format(entry, error))
 
 
 def main():
@@ -271,6 +283,15 @@ def main():
             mp.load_single_track()
         if event == 'PLAYLIST':
             mp.load_playlist_from_file()
+        if event == 'PLAYLIST_ITEM':
+            mp.add_playlist_item(*values['PLAYLIST_ITEM'])
+        if event == 'PLAYLIST_PROGRESS':
+            mp.show_playlist_progress(*values['PLAYLIST_PROGRESS'])
+        if event == 'PLAYLIST_DONE':
+            mp.finish_playlist(*values['PLAYLIST_DONE'])
+
+    if mp.playlist_loader is not None:
+        mp.playlist_loader.cancel()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,135 @@
+"""
+    Concurrent playlist ingestion for the media player
+
+    Playlist entries are classified up front as online urls or local paths and
+    resolved on a thread pool, with at most `max_in_flight` resolutions running
+    at once: local files are only stat'ed, online media go through pafy. Results
+    are handed to the GUI in playlist order as soon as every entry before them
+    is done, so the first tracks play while the rest are still resolving, and
+    progress and failures are reported without blocking the window.
+"""
+import os
+import re
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+MAX_WORKERS = 8
+MAX_IN_FLIGHT = 16
+URL_PATTERN = re.compile(r'^(https?://|www\.)', re.IGNORECASE)
+# Host name followed by a path, e.g. youtu.be/... without a scheme
+HOST_PATTERN = re.compile(r'^[a-z0-9-]+(\.[a-z0-9-]+)*\.[a-z]{2,}(:\d+)?/', re.IGNORECASE)
+VIDEO_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{11}$')  # pafy also accepts bare YouTube video ids
+
+
+class Resolved:
+    """ Playable media resource of a playlist entry """
+
+    __slots__ = ('source', 'mrl', 'title', 'author')
+
+    def __init__(self, source, mrl, title, author):
+        self.source = source  # Entry as written in the playlist
+        self.mrl = mrl  # What VLC opens, a stream url or a file path
+        self.title = title
+        self.author = author
+
+
+def classify(entry):
+    """ 'url' for online media, 'path' for local files, existing files always win """
+    if URL_PATTERN.match(entry):
+        return 'url'
+    if (HOST_PATTERN.match(entry) or VIDEO_ID_PATTERN.match(entry)) and not os.path.exists(entry):
+        return 'url'  # pafy accepts urls without a scheme and bare video ids
+    return 'path'
+
+
+def resolve_path(path):
+    """ Local file entry, raises OSError if the file is missing """
+    path = path.replace('\\', '/')
+    os.stat(path)
+    return Resolved(path, path, path.split('/').pop(), 'Local Media')
+
+
+def resolve_url(url):
+    """ Online entry, fetches the best stream through pafy """
+    import pafy  # Only needed once a playlist holds online media
+    vid = pafy.new(url)
+    return Resolved(url, vid.getbest().url, vid.title, vid.author)
+
+
+def resolve_entry(entry, resolve_url=resolve_url):
+    """ Resolve one playlist entry by its class """
+    if classify(entry) == 'url':
+        return resolve_url(entry)
+    return resolve_path(entry)
+
+
+def read_playlist(path):
+    """ Entries of a playlist file, without blank lines and # comments """
+    with open(path, 'r') as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+
+class PlaylistLoader:
+    """ Resolves playlist entries on a thread pool and posts them to `window` in order.
+
+        Events: 'PLAYLIST_ITEM' (index, Resolved or None, error message or None)
+                'PLAYLIST_PROGRESS' (resolved, total)
+                'PLAYLIST_DONE' (loaded, [(entry, error message), ...]) """
+
+    def __init__(self, entries, window, resolve=resolve_entry, max_workers=MAX_WORKERS,
+                 max_in_flight=MAX_IN_FLIGHT):
+        self.entries = list(entries)
+        self.window = window
+        self.resolve = resolve
+        self.max_workers = max_workers
+        self.max_in_flight = max_in_flight
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        """ Stop submitting entries, resolutions already running are left to finish """
+        self.cancelled.set()
+
+    def is_running(self):
+        return self.thread.is_alive()
+
+    def run(self):
+        """ Coordinator thread, keeps the pool busy and releases results in playlist order """
+        total = len(self.entries)
+        pending = iter(enumerate(self.entries))
+        in_flight = {}  # Future -> playlist index
+        finished = {}  # Playlist index -> future, waiting for the entries before it
+        next_index = 0
+        loaded, failures = 0, []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while True:
+                while len(in_flight) < self.max_in_flight and not self.cancelled.is_set():
+                    item = next(pending, None)
+                    if item is None:
+                        break
+                    index, entry = item
+                    in_flight[pool.submit(self.resolve, entry)] = index
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finished[in_flight.pop(future)] = future
+                while next_index in finished:
+                    future = finished.pop(next_index)
+                    try:
+                        resolved, error = future.result(), None
+                        loaded += 1
+                    except Exception as e:  # pafy raises plain Exceptions for unknown videos
+                        resolved, error = None, str(e) or type(e).__name__
+                        failures.append((self.entries[next_index], error))
+                    if not self.cancelled.is_set():
+                        self.window.write_event_value('PLAYLIST_ITEM', (next_index, resolved, error))
+                    next_index += 1
+                if not self.cancelled.is_set():
+                    self.window.write_event_value('PLAYLIST_PROGRESS', (next_index, total))
+        if not self.cancelled.is_set():
+            self.window.write_event_value('PLAYLIST_DONE', (loaded, failures))
@@ -0,0 +1,193 @@
+"""
+    Persistent cache of resolved online streams
+
+    Resolving an online entry through pafy fetches the video metadata and picks
+    the best stream, which takes seconds and is repeated every time the same
+    video is queued. The cache keeps the stream url, title and author per source
+    url in Streams.json, each with an expiry time that is checked on every read:
+    YouTube stream urls carry their own `expire` parameter, which caps the TTL.
+
+    Resolutions are single-flight: concurrent requests for a url that is being
+    resolved wait for that one fetch instead of starting their own. Failures are
+    passed to every waiter and not cached.
+
+    Usage: python streamCache.py check
+"""
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import parse_qs, urlparse
+
+from playlistLoader import Resolved, resolve_url
+
+CACHE_FILENAME = 'Streams.json'
+TTL_S = 5 * 3600  # Stream urls are signed for about six hours
+EXPIRY_MARGIN_S = 300  # Drop entries a little before the stream url stops working
+
+
+def stream_expiry(url):
+    """ Unix time of the `expire` parameter of a stream url, None if it has none """
+    try:
+        return float(parse_qs(urlparse(url).query)['expire'][0])
+    except (KeyError, ValueError):
+        return None
+
+
+class StreamCache:
+    """ Source url -> Resolved, persisted to `path`, refreshed through `resolve` once expired """
+
+    def __init__(self, path=CACHE_FILENAME, resolve=resolve_url, ttl=TTL_S, clock=time.time):
+        self.path = path
+        self.resolve_url = resolve
+        self.ttl = ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.flights = {}  # Source url -> Future of the resolution in progress
+        self.entries = self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):  # Missing or torn file, start over
+            return {}
+
+    def save(self):
+        """ Write the cache through a temp file, called with the lock held """
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self.entries, f, indent=4)
+        os.replace(temp_path, self.path)
+
+    def lookup(self, url):
+        """ Cached Resolved of `url`, None if there is none or it expired """
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is None or entry['expires'] <= self.clock():
+                return None
+            return Resolved(url, entry['mrl'], entry['title'], entry['author'])
+
+    def resolve(self, url):
+        """ Resolved of `url`, from the cache or from a single shared fetch """
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is not None and entry['expires'] > self.clock():
+                return Resolved(url, entry['mrl'], entry['title'], entry['author'])
+            flight = self.flights.get(url)
+            owner = flight is None
+            if owner:
+                flight = self.flights[url] = Future()
+        if not owner:
+            return flight.result()  # Raises the exception of the shared fetch
+
+        try:
+            resolved = self.resolve_url(url)
+        except BaseException as e:
+            with self.lock:
+                del self.flights[url]
+            flight.set_exception(e)
+            raise
+        expires = self.clock() + self.ttl
+        stream_expires = stream_expiry(resolved.mrl)
+        if stream_expires is not None:
+            expires = min(expires, stream_expires - EXPIRY_MARGIN_S)
+        with self.lock:
+            self.entries[url] = {'mrl': resolved.mrl, 'title': resolved.title, 'author': resolved.author,
+                                 'expires': expires}
+            del self.flights[url]
+            try:
+                self.save()
+            except OSError as e:  # The cache is an optimisation, playing must not fail on it
+                print('Could not save {}: {}'.format(self.path, e))
+        flight.set_result(resolved)
+        return resolved
+
+    def purge(self):
+        """ Remove expired entries, returns how many """
+        with self.lock:
+            now = self.clock()
+            expired = [url for url, entry in self.entries.items() if entry['expires'] <= now]
+            for url in expired:
+                del self.entries[url]
+            if expired:
+                self.save()
+            return len(expired)
+
+
+class StubResolver:
+    """ Resolver without network for checks: slow, counts its fetches, fails for urls containing 'missing' """
+
+    def __init__(self, delay=0.2, stream_ttl=None, clock=time.time):
+        self.delay = delay
+        self.stream_ttl = stream_ttl  # Adds an `expire` parameter to the stream url like YouTube does
+        self.clock = clock
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, url):
+        with self.lock:
+            self.calls[url] = self.calls.get(url, 0) + 1
+        time.sleep(self.delay)
+        if 'missing' in url:
+            raise Exception('Video not found: {}'.format(url))
+        mrl = 'https://stream.invalid/{}'.format(abs(hash(url)))
+        if self.stream_ttl is not None:
+            mrl += '?expire={}'.format(int(self.clock() + self.stream_ttl))
+        return Resolved(url, mrl, 'Title of ' + url, 'Author')
+
+
+def check(path):
+    """ Single-flight, expiry and persistence against the stub resolver """
+    now = [1000000.0]
+    clock = lambda: now[0]
+    stub = StubResolver(clock=clock)
+    cache = StreamCache(path, resolve=stub, ttl=60, clock=clock)
+    url = 'https://www.youtube.com/watch?v=stub0000001'
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(cache.resolve, [url] * 8))
+    assert stub.calls[url] == 1, 'concurrent requests fetched {} times'.format(stub.calls[url])
+    assert len({resolved.mrl for resolved in results}) == 1
+    print('single-flight: 8 concurrent requests, 1 fetch')
+
+    missing = 'https://www.youtube.com/watch?v=missing0001'
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(cache.resolve, missing) for _ in range(4)]
+    assert all(future.exception() is not None for future in futures)
+    assert stub.calls[missing] == 1 and cache.lookup(missing) is None
+    print('failures: shared by every waiter, not cached')
+
+    reopened = StreamCache(path, resolve=stub, ttl=60, clock=clock)
+    assert reopened.resolve(url).mrl == results[0].mrl and stub.calls[url] == 1
+    print('persistence: served from {} after reopening'.format(path))
+
+    now[0] += 61
+    assert reopened.lookup(url) is None
+    reopened.resolve(url)
+    assert stub.calls[url] == 2
+    print('expiry: refetched after the TTL')
+
+    stub.stream_ttl = 600
+    signed = 'https://www.youtube.com/watch?v=stub0000002'
+    reopened.ttl = 3600
+    reopened.resolve(signed)
+    assert reopened.entries[signed]['expires'] == now[0] + 600 - EXPIRY_MARGIN_S
+    print('expiry: capped by the expire parameter of the stream url')
+
+
+def main():
+    if len(sys.argv) != 2 or sys.argv[1] != 'check':
+        print("Usage: python streamCache.py check")
+        sys.exit(1)
+
+    import tempfile
+    with tempfile.TemporaryDirectory() as directory:
+        check(os.path.join(directory, CACHE_FILENAME))
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
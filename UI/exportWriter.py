@@ -0,0 +1,129 @@
+"""
+    Background writer for exported encodings
+
+    Exports are handed to a writer thread instead of being written on the GUI
+    thread. Exports that arrive within COALESCE_MS of each other are collected,
+    with the latest export of a track winning, and written together in one
+    put_many() on a store connection owned by the writer thread. The SQLite
+    store commits them in one transaction and the JSON store saves through a
+    temp file, fsync and rename, so a crash never leaves a half written store.
+
+    Until an export is written, get() answers with the pending effects, so
+    reloading a track never shows an encoding older than its last export.
+    An export can replace an older key of the same track, e.g. the basename
+    it was stored under before tracks were fingerprinted; that key is deleted
+    in the same write and reads as missing while the export is pending.
+    Once written, the 'flushed' status carries the written effects and the
+    file signatures before and after the write, so the GUI thread can update
+    its EncodingCache instead of re-reading the whole store.
+"""
+import threading
+import time
+
+from encodingStore import file_signature, open_store
+
+COALESCE_MS = 500  # Quiet time after the last export before the pending exports are written
+
+
+class ExportWriter:
+    """ Writes exports to the store at `store.path` on a background thread, reads go through `store` """
+
+    def __init__(self, store, window=None, delay_ms=COALESCE_MS, event_key='EXPORT_STATUS'):
+        self.store = store  # Store of the GUI thread, only read on the GUI thread
+        self.window = window
+        self.delay = delay_ms / 1000
+        self.event_key = event_key
+        self.pending = {}  # Filename -> effects waiting for the next write
+        self.writing = {}  # Filename -> effects being written right now
+        self.replaced = set()  # Older keys deleted with the next write
+        self.deleting = set()  # Older keys being deleted right now
+        self.last_export = 0.0
+        self.closing = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, filename, effects, replaces=None):
+        """ Queue the effects of a track for the next write, called on the GUI thread.
+            `replaces` is an older key of the track that is deleted with the write. """
+        if filename is None:
+            raise ValueError('Cannot export effects without a track')
+        with self.condition:
+            self.pending[filename] = list(effects)
+            if replaces is not None and replaces != filename:
+                self.replaced.add(replaces)
+            self.last_export = time.monotonic()
+            self.condition.notify()
+            count = len(self.pending)
+        self.post('pending', count)
+
+    def get(self, filename):
+        """ Effects of a track, pending exports first """
+        with self.condition:
+            effects = self.pending.get(filename, self.writing.get(filename))
+            if effects is None and (filename in self.replaced or filename in self.deleting):
+                return None  # Deleted with the next write
+        if effects is not None:
+            return list(effects)
+        return self.store.get(filename)
+
+    def is_pending(self, filename):
+        """ True while an export of `filename` is waiting for the next write """
+        with self.condition:
+            return filename in self.pending
+
+    def post(self, state, detail):
+        """ Hand a status update to the event loop, the window may be gone while closing """
+        if self.window is not None and not self.closing:
+            self.window.write_event_value(self.event_key, (state, detail))
+
+    def run(self):
+        """ Writer thread, writes pending exports once no export arrived for `delay` """
+        store = None
+        while True:
+            with self.condition:
+                while not self.pending and not self.closing:
+                    self.condition.wait()
+                if not self.pending:
+                    break
+                while not self.closing:
+                    remaining = self.last_export + self.delay - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                self.writing, self.pending = self.pending, {}
+                self.deleting, self.replaced = self.replaced, set()
+            try:
+                if store is None:
+                    store = open_store(self.store.path)  # SQLite connections cannot cross threads
+                before = file_signature(self.store.path)
+                store.put_many(self.writing.items())
+                deleted = sorted(self.deleting - set(self.writing))
+                if deleted:
+                    store.delete_many(deleted)
+                after = file_signature(self.store.path)
+            except Exception as e:  # Any failure must leave the thread alive, or later exports wait forever
+                with self.condition:
+                    for filename, effects in self.writing.items():
+                        self.pending.setdefault(filename, effects)  # Newer exports win over the failed ones
+                    self.replaced |= self.deleting
+                    self.writing, self.deleting = {}, set()
+                    self.last_export = time.monotonic()  # Retry after another quiet period
+                    closing = self.closing
+                self.post('failed', str(e) or type(e).__name__)
+                if closing:
+                    break
+            else:
+                with self.condition:
+                    written, self.writing, self.deleting = self.writing, {}, set()
+                self.post('flushed', (written, before, after, deleted))
+        if store is not None:
+            store.close()
+
+    def close(self):
+        """ Write whatever is pending at once and stop the writer thread, returns the tracks left unwritten """
+        with self.condition:
+            self.closing = True
+            self.condition.notify()
+        self.thread.join()
+        return sorted(self.pending)
@@ -0,0 +1,80 @@
+"""
+    Session handoff for hot reloading under watchDog.py
+
+    watchDog.py starts the application with HOT_RELOAD_STATE set to the path of
+    a state file and a pipe as stdin. To reload, it removes any stale state
+    file and writes 'snapshot' to that pipe. The application then writes its
+    session to the state file: the tracks, the current one, the playback
+    position and the rows of the effects table, suggestions included. After
+    that it exits. The next process reads the state file and restores the
+    session before its window is shown. The file is renamed to '.failed'
+    before restoring and only removed once the restore succeeded, so a state
+    that crashes the restore cannot break every later reload the same way.
+
+    Edits are also journaled per track, so nothing the operator did is lost if
+    the old process dies before the snapshot is written; the snapshot only adds
+    the position and the rows that are never journaled.
+"""
+import json
+import os
+import sys
+import threading
+
+STATE_ENV = 'HOT_RELOAD_STATE'  # Path of the state file, set by watchDog.py
+SNAPSHOT_COMMAND = 'snapshot'
+EVENT_KEY = 'HOT_RELOAD'
+
+
+def state_path():
+    """ Path of the state file when running under watchDog.py, None otherwise """
+    return os.environ.get(STATE_ENV) or None
+
+
+def write_state(path, state):
+    """ Write the session through a temp file, so a reader never sees half of it """
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def read_state(path):
+    """ Session left by the previous process, None if there is none """
+    if path is None:
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def remove_state(path):
+    """ Remove a state file once it is no longer needed """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def quarantine_state(path):
+    """ Set aside a state while it is restored, returns where it was moved """
+    failed_path = path + '.failed'
+    try:
+        os.replace(path, failed_path)
+    except FileNotFoundError:
+        pass
+    return failed_path
+
+
+def listen(window, path):
+    """ Post EVENT_KEY with the state path when watchDog.py asks for a snapshot on stdin """
+    def run():
+        for line in sys.stdin:
+            if line.strip() == SNAPSHOT_COMMAND:
+                window.write_event_value(EVENT_KEY, path)
+                return
+
+    threading.Thread(target=run, daemon=True).start()
@@ -0,0 +1,69 @@
+"""
+    Keyboard driven effect capture
+
+    Each key in the keymap adds one effect type. Keys are read by a pynput
+    listener on its own thread, stamped with perf_counter_ns() as they arrive and
+    queued to the event loop as HOTKEY events, so the stamp stays exact even when
+    the GUI thread is busy. Without pynput the keys are read through Tk bindings on
+    the GUI thread instead, which still stamps them before any other work happens.
+    Keys only count while the player window has focus.
+"""
+import time
+
+try:
+    from pynput import keyboard
+except ImportError:  # Optional, fall back to Tk key bindings
+    keyboard = None
+
+DEFAULT_KEYMAP = {'1': 'Affect1', '2': 'Affect2', '3': 'Affect3'}
+
+
+class HotkeyCapture:
+    """ Queues (perf_counter_ns, effect) HOTKEY events for mapped keys pressed in `window` """
+
+    def __init__(self, window, keymap=None, event_key='HOTKEY'):
+        self.window = window
+        self.keymap = dict(keymap or DEFAULT_KEYMAP)
+        self.event_key = event_key
+        self.enabled = False
+        self.focused = True  # Updated from Tk focus events, read by the listener thread
+        self.listener = None
+
+        root = window.TKroot
+        root.bind('<FocusIn>', self.on_focus_in, add='+')
+        root.bind('<FocusOut>', self.on_focus_out, add='+')
+        if keyboard is None:
+            root.bind('<KeyPress>', self.on_tk_key, add='+')
+
+    def start(self):
+        self.enabled = True
+        if keyboard is not None and self.listener is None:
+            self.listener = keyboard.Listener(on_press=self.on_press)
+            self.listener.daemon = True
+            self.listener.start()
+
+    def stop(self):
+        self.enabled = False
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def on_focus_in(self, event):
+        self.focused = True
+
+    def on_focus_out(self, event):
+        self.focused = False
+
+    def capture(self, counter_ns, char):
+        if self.enabled and self.focused and char in self.keymap:
+            self.window.write_event_value(self.event_key, (counter_ns, self.keymap[char]))
+
+    def on_press(self, key):
+        """ Called on the pynput listener thread """
+        counter_ns = time.perf_counter_ns()
+        self.capture(counter_ns, getattr(key, 'char', None))
+
+    def on_tk_key(self, event):
+        """ Called on the GUI thread when pynput is not installed """
+        counter_ns = time.perf_counter_ns()
+        self.capture(counter_ns, event.char)
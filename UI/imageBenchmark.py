@@ -0,0 +1,92 @@
+"""
+    Button image benchmark
+
+    Compares loading the player buttons from image files, as update(image_filename=...)
+    does on every toggle, with the preloaded ButtonImages cache. Reports the time to
+    open a window with the media player buttons and the latency of a play/pause toggle.
+
+    Usage: python imageBenchmark.py [toggles]
+"""
+import os
+import sys
+import time
+import json
+
+import PySimpleGUI as sg
+
+from buttonImages import ButtonImages
+
+PATH = os.path.join(os.path.abspath('.'), 'Assets')
+BUTTONS = {'SKIP PREVIOUS': 'START', 'PAUSE': 'PAUSE_OFF', 'PLAY': 'PLAY_OFF',
+           'STOP': 'STOP', 'SOUND': 'SOUND_ON', 'PLUS': 'PLUS'}
+
+
+def filename(image):
+    return os.path.join(PATH, image.lower() + '.png')
+
+
+def open_from_files():
+    layout = [[sg.Button(image_filename=filename(image), key=key) for key, image in BUTTONS.items()]]
+    return sg.Window('Files', layout, finalize=True)
+
+
+def open_from_cache(images):
+    layout = [[sg.Button(image_data=images.data[image], key=key) for key, image in BUTTONS.items()]]
+    window = sg.Window('Cache', layout, finalize=True)
+    for key, image in BUTTONS.items():
+        images.adopt(window[key], image)
+    images.preload(window.TKroot)
+    return window
+
+
+def toggle_files(window, playing):
+    window['PLAY'].update(image_filename=filename('PLAY_ON' if playing else 'PLAY_OFF'))
+    window['PAUSE'].update(image_filename=filename('PAUSE_OFF' if playing else 'PAUSE_ON'))
+
+
+def toggle_cache(images):
+    def toggle(window, playing):
+        images.show(window['PLAY'], 'PLAY_ON' if playing else 'PLAY_OFF')
+        images.show(window['PAUSE'], 'PAUSE_OFF' if playing else 'PAUSE_ON')
+    return toggle
+
+
+def measure_toggles(window, toggle, toggles):
+    """ Mean and worst toggle latency in milliseconds, including the Tk redraw """
+    latencies = []
+    for i in range(toggles):
+        start = time.perf_counter()
+        toggle(window, i % 2 == 0)
+        window.refresh()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return sum(latencies) / len(latencies), max(latencies)
+
+
+def main():
+    toggles = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    results = {}
+    start = time.perf_counter()
+    window = open_from_files()
+    results['files'] = {'startup_ms': (time.perf_counter() - start) * 1000}
+    results['files']['toggle_mean_ms'], results['files']['toggle_max_ms'] = measure_toggles(
+        window, toggle_files, toggles)
+    window.close()
+
+    start = time.perf_counter()
+    images = ButtonImages(PATH)
+    window = open_from_cache(images)
+    results['cache'] = {'startup_ms': (time.perf_counter() - start) * 1000}
+    results['cache']['toggle_mean_ms'], results['cache']['toggle_max_ms'] = measure_toggles(
+        window, toggle_cache(images), toggles)
+    window.close()
+
+    print('{:<8}{:>14}{:>18}{:>17}'.format('images', 'startup (ms)', 'toggle mean (ms)', 'toggle max (ms)'))
+    for name, result in results.items():
+        print('{:<8}{:>14.2f}{:>18.3f}{:>17.3f}'.format(
+            name, result['startup_ms'], result['toggle_mean_ms'], result['toggle_max_ms']))
+    print(json.dumps({'toggles': toggles, 'results': results}))
+
+
+if __name__ == '__main__':
+    main()
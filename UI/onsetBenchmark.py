@@ -0,0 +1,51 @@
+"""
+    Onset detection throughput benchmark
+
+    Runs the streaming onset detector over synthetic audio (noise with a click
+    every half second), or over real tracks when paths are given, and reports
+    throughput in audio seconds analysed per wall clock second.
+
+    Usage: python onsetBenchmark.py [track ...]
+"""
+import sys
+import time
+
+import numpy as np
+
+from audioDecode import BLOCK_SIZE, decode_blocks
+from onsetDetection import HOP_SIZE, ONSET_RATE, pick_onsets, spectral_flux
+
+SYNTHETIC_SECONDS = 600
+CLICK_INTERVAL_MS = 500
+
+
+def synthetic_blocks(seconds, sample_rate=ONSET_RATE, block_size=BLOCK_SIZE):
+    """ Yield int16 blocks of quiet noise with a short loud burst every CLICK_INTERVAL_MS """
+    rng = np.random.default_rng(69)
+    total = int(seconds * sample_rate)
+    interval = sample_rate * CLICK_INTERVAL_MS // 1000
+    for start in range(0, total, block_size):
+        count = min(block_size, total - start)
+        block = rng.normal(0, 300, count)
+        positions = np.arange(start, start + count)
+        block[positions % interval < 64] += rng.normal(0, 12000, np.count_nonzero(positions % interval < 64))
+        yield np.clip(block, -32768, 32767).astype(np.int16)
+
+
+def run(name, blocks, seconds):
+    start = time.perf_counter()
+    onsets = pick_onsets(spectral_flux(blocks), HOP_SIZE * 1000 / ONSET_RATE)
+    elapsed = time.perf_counter() - start
+    print('{:<40}{:>10.1f}{:>10.3f}{:>10}{:>14.1f}'.format(name[-40:], seconds, elapsed, len(onsets), seconds / elapsed))
+
+
+def main():
+    print('{:<40}{:>10}{:>10}{:>10}{:>14}'.format('input', 'audio (s)', 'wall (s)', 'onsets', 'audio s/wall s'))
+    run('synthetic', synthetic_blocks(SYNTHETIC_SECONDS), SYNTHETIC_SECONDS)
+    for path in sys.argv[1:]:
+        blocks = list(decode_blocks(path, ONSET_RATE))  # Decode up front so only analysis is timed
+        run(path, iter(blocks), sum(len(block) for block in blocks) / ONSET_RATE)
+
+
+if __name__ == '__main__':
+    main()
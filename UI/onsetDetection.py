@@ -0,0 +1,118 @@
+"""
+    Onset detection to pre-seed effect timestamps
+
+    Audio is decoded in fixed-size blocks and turned into a spectral flux curve
+    one block at a time, so memory stays bounded on hour-long files: only the
+    flux (one float per HOP_SIZE samples) is kept for the whole track. Onsets are
+    the local maxima of the flux that rise above a moving average threshold.
+
+    The batch mode writes the suggestions keyed by track fingerprint, the key
+    of the track in the encoding store; files that fail are reported and skipped.
+
+    Usage: python onsetDetection.py [media_directory] --out suggestions.json
+"""
+import argparse
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from audioDecode import decode_blocks
+from batchEncoder import find_media
+from effectTimeline import format_timestamp
+from trackIdentity import fingerprint
+
+ONSET_RATE = 11025  # Decode rate for analysis
+FRAME_SIZE = 1024  # FFT size in samples
+HOP_SIZE = 512  # Samples between frames (~46 ms at ONSET_RATE)
+THRESHOLD_FRAMES = 16  # Frames each side of the moving threshold window
+THRESHOLD_DELTA = 0.05  # Normalized flux an onset must rise above the local mean
+MIN_GAP_MS = 100  # Minimum distance between two suggested onsets
+
+
+def spectral_flux(blocks, frame_size=FRAME_SIZE, hop_size=HOP_SIZE):
+    """ Positive spectral flux per hop of a stream of int16 sample blocks """
+    window = np.hanning(frame_size).astype(np.float32)
+    carry = np.zeros(frame_size - hop_size, dtype=np.float32)  # Frame i ends with samples [i*hop, (i+1)*hop)
+    previous = None
+    flux = []
+    for block in blocks:
+        samples = np.concatenate((carry, block.astype(np.float32) / 32768))
+        count = (len(samples) - frame_size) // hop_size + 1
+        if count <= 0:
+            carry = samples
+            continue
+        frames = sliding_window_view(samples, frame_size)[::hop_size][:count]
+        spectrum = np.log1p(100 * np.abs(np.fft.rfft(frames * window, axis=1)))
+        if previous is None:
+            previous = spectrum[:1]
+        rise = np.diff(np.concatenate((previous, spectrum)), axis=0)
+        flux.append(np.maximum(rise, 0).sum(axis=1))
+        previous = spectrum[-1:]
+        carry = samples[count * hop_size:]
+    return np.concatenate(flux) if flux else np.zeros(0, dtype=np.float32)
+
+
+def pick_onsets(flux, hop_ms, threshold_frames=THRESHOLD_FRAMES, delta=THRESHOLD_DELTA, min_gap_ms=MIN_GAP_MS):
+    """ Times in milliseconds of the flux peaks above the moving threshold """
+    if not len(flux):
+        return []
+    flux = flux / (flux.max() or 1)
+    size = 2 * threshold_frames + 1
+    padded = np.pad(flux, threshold_frames, mode='edge')
+    local_mean = np.convolve(padded, np.ones(size) / size, mode='valid')
+    local_max = sliding_window_view(padded, size).max(axis=1)
+    peaks = np.flatnonzero((flux == local_max) & (flux > local_mean + delta))
+
+    onsets = []
+    for onset_ms in (peaks * hop_ms).astype(np.int64):
+        if not onsets or onset_ms - onsets[-1] >= min_gap_ms:
+            onsets.append(int(onset_ms))
+    return onsets
+
+
+def detect_onsets(path, sample_rate=ONSET_RATE):
+    """ Suggested effect times in milliseconds for the track at `path` """
+    flux = spectral_flux(decode_blocks(path, sample_rate))
+    return pick_onsets(flux, HOP_SIZE * 1000 / sample_rate)
+
+
+def analyse(path):
+    """ (store key, onsets, error) of one track, errors are returned so one bad file does not stop a batch """
+    try:
+        return fingerprint(path), detect_onsets(path), None
+    except Exception as e:  # Undecodable or unreadable, raised in a worker process
+        return None, None, str(e) or type(e).__name__
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Suggest effect timestamps for every track in a directory')
+    parser.add_argument('directory', help='media library to analyse')
+    parser.add_argument('--out', default='suggestions.json', help='where to write the suggestions')
+    parser.add_argument('--workers', type=int, default=None, help='analysis processes, defaults to the CPU count')
+    args = parser.parse_args()
+
+    paths = sorted(path for paths in find_media(args.directory).values() for path in paths)
+    suggestions = {}
+    failures = []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for path, (key, onsets, error) in zip(paths, pool.map(analyse, paths)):
+            if error is not None:
+                print('{}: failed, {}'.format(path, error))
+                failures.append(path)
+                continue
+            suggestions[key] = [format_timestamp(onset_ms) for onset_ms in onsets]
+            print('{}: {} onsets'.format(path, len(onsets)))
+
+    with open(args.out, 'w') as file:
+        json.dump(suggestions, file, indent=4)
+    print('Suggestions for {} tracks written to {}'.format(len(suggestions), args.out))
+    if failures:
+        print('{} tracks could not be analysed'.format(len(failures)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
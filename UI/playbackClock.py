@@ -0,0 +1,97 @@
+"""
+    High resolution playback clock
+
+    VLC's get_time() only moves on in coarse steps, so reading it when a key is
+    tapped gives a stale, jittery time. PlaybackClock anchors VLC's clock to
+    time.perf_counter_ns(): every time VLC reports a new value the anchor is pulled
+    a fraction of the way towards it and the playback rate is nudged to cancel
+    drift, while large jumps (seeks) re-anchor immediately. A VLC time we only
+    notice some time after it changed is stale, so errors that say the estimate
+    runs ahead are corrected much more slowly than errors that say it lags.
+
+    A tap is stamped with perf_counter_ns() the moment it arrives and converted
+    to playback time through the anchor, minus a configurable operator latency.
+"""
+import threading
+import time
+
+RESYNC_MS = 500  # Errors larger than this are seeks and re-anchor the clock
+PHASE_GAIN = 0.5  # Fraction of a lagging estimate corrected per VLC update
+STALE_PHASE_GAIN = 0.05  # Fraction of a leading estimate corrected, VLC's reading may be stale
+RATE_GAIN = 0.01  # Fraction of the measured rate error corrected per VLC update
+MAX_RATE_ERROR = 0.01  # Playback rate is kept within 1% of real time
+
+
+class PlaybackClock:
+    """ Playback time in milliseconds interpolated between VLC clock updates """
+
+    def __init__(self, player, latency_ms=0):
+        self.player = player
+        self.latency_ms = latency_ms  # Subtracted from every tap, covers the operator's reaction time
+        self.lock = threading.Lock()  # Shared by the GUI thread and the effect dispatcher
+        self.reset()
+
+    def reset(self):
+        self.anchor_ms = None  # Playback time at `anchor_ns`
+        self.anchor_ns = None
+        self.rate = 1.0  # Playback milliseconds per real millisecond
+        self.last_vlc_time = None
+        self.last_time = None  # Last value returned by now()
+
+    def time_at(self, counter_ns):
+        """ Playback time at a perf_counter_ns() reading, the clock must be anchored """
+        return self.anchor_ms + (counter_ns - self.anchor_ns) / 1e6 * self.rate
+
+    def sync(self):
+        """ Fold the latest VLC time into the anchor, returns False when nothing is playing """
+        if not self.player.is_playing():
+            self.reset()
+            return False
+        self.observe(self.player.get_time(), time.perf_counter_ns())
+        return True
+
+    def update(self, vlc_time, counter_ns):
+        """ Feed a get_time() reading taken elsewhere at perf_counter_ns() `counter_ns` """
+        with self.lock:
+            self.observe(vlc_time, counter_ns)
+
+    def observe(self, vlc_time, counter_ns):
+        """ Pull the anchor towards a VLC time reading, the lock must be held """
+        if vlc_time == self.last_vlc_time:
+            return
+        self.last_vlc_time = vlc_time
+        if self.anchor_ns is None:
+            self.anchor_ms, self.anchor_ns = vlc_time, counter_ns
+            return
+
+        estimate = self.time_at(counter_ns)
+        error = vlc_time - estimate
+        if abs(error) > RESYNC_MS:
+            self.reset()
+            self.last_vlc_time = vlc_time
+            self.anchor_ms, self.anchor_ns = vlc_time, counter_ns
+            return
+        elapsed = (counter_ns - self.anchor_ns) / 1e6
+        gain = PHASE_GAIN if error > 0 else STALE_PHASE_GAIN
+        self.anchor_ms, self.anchor_ns = estimate + error * gain, counter_ns
+        if elapsed > 0:
+            rate = self.rate + RATE_GAIN * error / elapsed
+            self.rate = min(1 + MAX_RATE_ERROR, max(1 - MAX_RATE_ERROR, rate))
+
+    def now(self):
+        """ Current playback time in milliseconds, None when nothing is playing """
+        with self.lock:
+            if not self.sync():
+                return None
+            current = self.time_at(time.perf_counter_ns())
+            if self.last_time is not None and self.last_time - RESYNC_MS < current < self.last_time:
+                current = self.last_time  # Never step back because of a correction
+            self.last_time = current
+            return current
+
+    def tap_time(self, counter_ns):
+        """ Playback time in whole milliseconds of a tap stamped with perf_counter_ns() """
+        with self.lock:
+            if not self.sync():
+                return self.player.get_time()  # Paused or stopped, VLC's position is exact
+            return max(0, int(round(self.time_at(counter_ns) - self.latency_ms)))
@@ -0,0 +1,68 @@
+"""
+    Memory and file size benchmark for effect IDs
+
+    Builds a synthetic library and compares the memory of holding every track's
+    effects as [timestamp, name] rows, as the store and the old timeline did,
+    with array-backed timelines that keep an effect type ID per cue and with the
+    cue file bytes EncodingCache holds per track. File sizes compare the
+    Encodings.json layout with the binary cue format.
+
+    Usage: python registryBenchmark.py [tracks] [cues_per_track]
+"""
+import json
+import random
+import sys
+import tracemalloc
+
+from cueFormat import encode
+from effectRegistry import REGISTRY
+from effectTimeline import EffectTimeline, format_timestamp
+from encodingStore import pack
+
+
+def synthetic_library(tracks, cues, rng):
+    """ {filename: rows} with cues spread over a four minute track """
+    names = [effect_type.name for effect_type in REGISTRY.configured()]
+    return {'track{:05d}.mp3'.format(track): [[format_timestamp(time), rng.choice(names)]
+                                              for time in sorted(rng.randint(0, 240000) for _ in range(cues))]
+            for track in range(tracks)}
+
+
+def traced(build):
+    """ Bytes still allocated by `build()` once it returned """
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def main():
+    tracks = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    cues = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    library = synthetic_library(tracks, cues, random.Random(69))
+    text = json.dumps(library, indent=4)
+    del library
+
+    # Both layouts are decoded from the same JSON, so shared strings are counted the same way
+    _, rows_bytes = traced(lambda: json.loads(text))
+    _, timeline_bytes = traced(lambda: {filename: EffectTimeline.from_rows(rows)
+                                        for filename, rows in json.loads(text).items()})
+    _, cache_bytes = traced(lambda: {filename: pack(rows) for filename, rows in json.loads(text).items()})
+
+    library = json.loads(text)
+    json_bytes = len(text.encode())
+    cue_bytes = sum(len(encode(rows)) for rows in library.values())
+
+    print('{} tracks, {} cues per track'.format(tracks, cues))
+    print('{:<24}{:>14}{:>14}{:>14}'.format('', 'rows', 'ids', 'cache'))
+    print('{:<24}{:>14,}{:>14,}{:>14,}'.format('memory (bytes)', rows_bytes, timeline_bytes, cache_bytes))
+    print('{:<24}{:>14,}{:>14,}'.format('on disk (bytes)', json_bytes, cue_bytes))
+    print(json.dumps({'tracks': tracks, 'cues': cues,
+                      'memory': {'rows': rows_bytes, 'ids': timeline_bytes, 'cache': cache_bytes},
+                      'file': {'json': json_bytes, 'cues': cue_bytes}}))
+
+
+if __name__ == '__main__':
+    main()
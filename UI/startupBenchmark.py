@@ -0,0 +1,50 @@
+"""
+    Cold start benchmark for PlayerWithTableAndExport
+
+    Launches the player repeatedly with --startup-report and measures, from the
+    moment the process was spawned, how long it took until the window was shown
+    and until VLC was ready to play. Each run is a fresh process, once in the
+    default mode and once with --fast-start. Pass the one-dir build's executable
+    to measure the frozen application instead of the script.
+
+    Usage: python startupBenchmark.py [runs] [executable]
+"""
+import os
+import subprocess
+import sys
+import time
+import json
+import statistics
+
+
+def launch(command):
+    """ Seconds from spawning `command` until it reported the window and the player """
+    started = time.time()
+    output = subprocess.run(command + ['--startup-report'], capture_output=True, text=True, check=True).stdout
+    times = dict(line.split() for line in output.splitlines() if line.startswith(('window ', 'player ')))
+    return float(times['window']) - started, float(times['player']) - started
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    if len(sys.argv) > 2:
+        command = [os.path.abspath(sys.argv[2])]
+    else:
+        command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                'PlayerWithTableAndExport.py')]
+
+    launch(command)  # Warm the OS file cache, so every measured run starts from the same state
+    results = {}
+    for mode, flags in (('default', []), ('fast_start', ['--fast-start'])):
+        samples = [launch(command + flags) for _ in range(runs)]
+        results[mode] = {'window_s': statistics.median(window for window, _ in samples),
+                         'player_s': statistics.median(player for _, player in samples)}
+
+    print('{:<12}{:>12}{:>12}'.format('mode', 'window (s)', 'player (s)'))
+    for mode, result in results.items():
+        print('{:<12}{:>12.3f}{:>12.3f}'.format(mode, result['window_s'], result['player_s']))
+    print(json.dumps({'runs': runs, 'command': command, 'median': results}))
+
+
+if __name__ == '__main__':
+    main()
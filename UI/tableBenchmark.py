@@ -0,0 +1,75 @@
+"""
+    Add-effect latency benchmark for the effects table
+
+    Compares re-rendering the whole sg.Table on every add (the old add_effect)
+    with inserting a single row through EffectsTableModel, at several table sizes.
+    Each add includes a window refresh so the Treeview redraw is measured too.
+
+    Usage: python tableBenchmark.py [adds_per_size]
+"""
+import random
+import sys
+import time
+
+import PySimpleGUI as sg
+
+from effectTimeline import EffectTimeline, format_timestamp
+from effectsTable import EffectsTableModel
+
+SIZES = (100, 1000, 10000)
+
+
+def random_timeline(rows, rng):
+    timeline = EffectTimeline()
+    for _ in range(rows):
+        timeline.add(rng.randint(0, 3600000), 'Affect{}'.format(rng.randint(1, 3)))
+    return timeline
+
+
+def create_window():
+    layout = [[sg.Table(values=[], headings=['Timestamp', 'Effect'], display_row_numbers=True,
+                        key='EFFECTS_TABLE', size=(720, 10), enable_events=True)]]
+    return sg.Window('Table benchmark', layout, finalize=True)
+
+
+def bench_full_update(window, timeline, adds, rng):
+    """ Mean milliseconds per add when the whole table is re-rendered """
+    table = window['EFFECTS_TABLE']
+    table.update(values=timeline.rows())
+    window.refresh()
+    start = time.perf_counter()
+    for _ in range(adds):
+        row = [format_timestamp(rng.randint(0, 3600000)), 'Affect1']
+        table.update(values=table.get() + [row])
+        window.refresh()
+    return (time.perf_counter() - start) * 1000 / adds
+
+
+def bench_model_insert(window, timeline, adds, rng):
+    """ Mean milliseconds per add when a single row is inserted """
+    model = EffectsTableModel(window['EFFECTS_TABLE'])
+    model.load(timeline)
+    window.refresh()
+    start = time.perf_counter()
+    for _ in range(adds):
+        model.insert(rng.randint(0, 3600000), 'Affect1')
+        window.refresh()
+    return (time.perf_counter() - start) * 1000 / adds
+
+
+def main():
+    adds = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    rng = random.Random(69)
+    window = create_window()
+
+    print('{:>8}{:>16}{:>16}'.format('rows', 'full (ms/add)', 'model (ms/add)'))
+    for rows in SIZES:
+        full = bench_full_update(window, random_timeline(rows, rng), adds, rng)
+        model = bench_model_insert(window, random_timeline(rows, rng), adds, rng)
+        print('{:>8}{:>16.3f}{:>16.3f}'.format(rows, full, model))
+
+    window.close()
+
+
+if __name__ == '__main__':
+    main()
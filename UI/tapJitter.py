@@ -0,0 +1,58 @@
+"""
+    Tap timestamp jitter measurement
+
+    Taps at random moments against a simulated player whose get_time() advances in
+    coarse steps, like VLC's, and compares two ways of stamping each tap with the
+    true playback time: reading player.get_time() (the old add_effect) and
+    PlaybackClock.tap_time() on a perf_counter_ns() stamp.
+
+    Usage: python tapJitter.py [taps] [update_ms]
+"""
+import random
+import statistics
+import sys
+import time
+
+from dispatchHarness import SimulatedPlayer
+from playbackClock import PlaybackClock
+
+
+def distribution(errors):
+    """ Summary of signed stamping errors in milliseconds """
+    ordered = sorted(errors)
+
+    def pick(percent):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+    return 'mean {:7.2f}  stdev {:6.2f}  p1 {:7.2f}  p50 {:7.2f}  p99 {:7.2f}'.format(
+        statistics.mean(errors), statistics.pstdev(errors), pick(1), pick(50), pick(99))
+
+
+def main():
+    taps = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    update_ms = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    rng = random.Random(69)
+    player = SimulatedPlayer(update_ms=update_ms)
+    clock = PlaybackClock(player)
+    raw_errors, clock_errors = [], []
+
+    # Keep the clock synced in the background, as the event loop and dispatcher do in the player
+    deadline = time.perf_counter()
+    for _ in range(taps):
+        deadline += rng.uniform(0.02, 0.2)
+        while time.perf_counter() < deadline:
+            clock.now()
+            time.sleep(0.005)
+        tap_ns = time.perf_counter_ns()
+        true_time = player.true_time()
+        raw_errors.append(player.get_time() - true_time)
+        clock_errors.append(clock.tap_time(tap_ns) - true_time)
+
+    print('Stamping error against true playback time over {} taps ({} ms clock updates)'.format(taps, update_ms))
+    print('get_time()       {}'.format(distribution(raw_errors)))
+    print('PlaybackClock    {}'.format(distribution(clock_errors)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+    Content fingerprints as track identity
+
+    Encodings used to be keyed by the basename of the track, so two different
+    intro.mp3 files shared one encoding and a renamed file lost its own. Tracks
+    are now keyed by a fingerprint of their content: a hash of the file size and
+    three sampled chunks, read through mmap so only the sampled pages are ever
+    touched, never the whole file. Fingerprints are cached per path and reused
+    while the file's mtime and size are unchanged, so reloading a track costs a
+    stat() instead of a hash.
+
+    Encodings stored under a basename are still found for a track until it is
+    exported again under its fingerprint. The migrate command re-keys them all
+    at once for the media found under a directory.
+
+    Usage: python trackIdentity.py migrate [media_directory] [--store Encodings.db]
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import re
+import tempfile
+
+CACHE_FILENAME = 'Fingerprints.json'
+SAMPLE_CHUNK = 1 << 16  # Bytes hashed from each sampled region of a file
+FINGERPRINT = re.compile(r'^[0-9a-f]{32}$')
+
+
+def fingerprint(path):
+    """ Hash of the size and the first, middle and last SAMPLE_CHUNK bytes of a file """
+    size = os.path.getsize(path)
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    if size == 0:
+        return digest.hexdigest()  # mmap cannot map an empty file
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for offset in (0, max(0, size // 2 - SAMPLE_CHUNK // 2), max(0, size - SAMPLE_CHUNK)):
+            digest.update(data[offset:offset + SAMPLE_CHUNK])
+    return digest.hexdigest()
+
+
+def is_fingerprint(key):
+    """ True for store keys written since tracks are fingerprinted, False for basenames """
+    return bool(FINGERPRINT.match(key))
+
+
+class TrackIdentity:
+    """ Path -> fingerprint cache, persisted to `cache_path` when given """
+
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path
+        self.entries = {}  # Absolute path -> [mtime_ns, size, fingerprint]
+        self.dirty = False
+        if cache_path is not None:
+            try:
+                with open(cache_path) as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                pass  # No cache yet or a damaged one, fingerprints are simply computed again
+
+    def key(self, path):
+        """ Fingerprint of the track at `path`, from the cache while the file is unchanged """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        entry = self.entries.get(path)
+        if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            return entry[2]
+        key = fingerprint(path)
+        self.entries[path] = [stat.st_mtime_ns, stat.st_size, key]
+        self.dirty = True
+        return key
+
+    def save(self):
+        """ Write the cache through a temp file, if anything was fingerprinted since it was read """
+        if self.cache_path is None or not self.dirty:
+            return
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.cache_path)), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(temp_path, self.cache_path)
+        self.dirty = False
+
+
+def migrate(store, media, identity):
+    """ Re-key basename entries of `store` by the fingerprint of their media file.
+        `media` maps basenames to paths, returns (migrated, ambiguous, missing, unreadable) basenames. """
+    migrated, ambiguous, missing, unreadable = [], [], [], []
+    updates = []
+    for filename, effects in list(store.items()):
+        if is_fingerprint(filename):
+            continue
+        paths = media.get(filename, [])
+        if len(paths) == 1:
+            try:
+                key = identity.key(paths[0])
+            except OSError as e:
+                print('Could not read {}: {}'.format(paths[0], e))
+                unreadable.append(filename)
+                continue
+            if key not in store:  # An encoding exported under the fingerprint is newer
+                updates.append((key, effects))
+            migrated.append(filename)
+        elif paths:
+            ambiguous.append(filename)  # No way to tell which of the files the encoding belongs to
+        else:
+            missing.append(filename)
+    store.put_many(updates)
+    store.delete_many(migrated)  # One transaction or rewrite, not one per basename
+    return migrated, ambiguous, missing, unreadable
+
+
+def main():
+    from batchEncoder import find_media
+    from encodingStore import open_default_store, open_store
+
+    parser = argparse.ArgumentParser(description='Re-key stored encodings by track fingerprint')
+    parser.add_argument('command', choices=['migrate'])
+    parser.add_argument('directory', help='media library the stored basenames refer to')
+    parser.add_argument('--store', help='Encodings.db or Encodings.json, defaults to the one next to this script')
+    args = parser.parse_args()
+
+    directory = os.path.dirname(os.path.abspath(__file__))
+    store = open_store(args.store) if args.store else open_default_store(directory)
+    identity = TrackIdentity(os.path.join(directory, CACHE_FILENAME))
+    migrated, ambiguous, missing, unreadable = migrate(store, find_media(args.directory), identity)
+    identity.save()
+    store.close()
+
+    print("Migrated {} encodings to fingerprints".format(len(migrated)))
+    if ambiguous:
+        print("Left {} basenames that match several media files: {}".format(len(ambiguous), ', '.join(ambiguous)))
+    if missing:
+        print("Left {} basenames without a media file: {}".format(len(missing), ', '.join(missing)))
+    if unreadable:
+        print("Left {} basenames whose media file could not be read: {}".format(len(unreadable), ', '.join(unreadable)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""
+    Multi-track encoding session with media prefetching
+
+    A session is the queue of tracks an operator encodes in one sitting, e.g. an
+    album. Whenever a track is selected the next tracks are prepared on a
+    background thread: their vlc.Media is created and parsed and their stored
+    effects are turned into an EffectTimeline. Prepared tracks are kept in a
+    bounded LRU, so moving to the next or previous track only hands an already
+    parsed media to the player. A track that was not prefetched, e.g. the first
+    one or a jump, is handed over unparsed and VLC parses it while it starts
+    playing; the GUI thread never waits for a parse.
+
+    Encodings are looked up by the fingerprint of the track, falling back to its
+    basename for encodings stored before tracks were fingerprinted. Exporting
+    such a track moves the basename entry to its fingerprint, so another file
+    with the same name no longer inherits that encoding. The encoding
+    store is only read on the GUI thread; the worker gets the rows
+    it has to parse. A prepared timeline is handed out once and only while the
+    stored rows it was built from are unchanged, so exports and edits made
+    since it was prepared are never lost.
+"""
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+from effectTimeline import EffectTimeline
+
+PREFETCH = 2  # Tracks after the current one that are prepared in the background
+CAPACITY = 8  # Prepared tracks kept in memory, least recently used are released first
+PARSE_TIMEOUT_MS = 5000
+
+
+def track_name(path):
+    """ Filename of a track, the key of its encoding in the store """
+    return path.replace('\\', '/').split('/').pop()
+
+
+class PreparedTrack:
+    """ A parsed vlc.Media and the timeline built from the stored effects of one track """
+
+    def __init__(self, path, media, rows, timeline):
+        self.path = path
+        self.media = media
+        self.rows = rows  # Stored effects the timeline was built from, None when there was no encoding
+        self.timeline = timeline  # Handed out once, None afterwards
+
+
+class TrackSession:
+    """ Queue of tracks with the tracks around the current one prepared ahead of time """
+
+    def __init__(self, instance, store, identity, prefetch=PREFETCH, capacity=CAPACITY):
+        self.instance = instance
+        self.store = store
+        self.identity = identity  # TrackIdentity that fingerprints the tracks
+        self.prefetch = prefetch
+        self.capacity = max(capacity, prefetch + 2)  # Room for the current, previous and prefetched tracks
+        self.tracks = []
+        self.index = -1  # Index of the current track, -1 before one is selected
+        self.prepared = OrderedDict()  # Path -> PreparedTrack, least recently used first
+        self.queued = set()  # Paths waiting for the worker
+        self.lock = threading.Lock()  # Guards `prepared` and `queued`, shared with the worker
+        self.pending = queue.Queue()
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+    def __len__(self):
+        return len(self.tracks)
+
+    @property
+    def current(self):
+        return self.tracks[self.index] if self.index >= 0 else None
+
+    def add(self, paths):
+        """ Append tracks to the session, returns the index of the first one added """
+        first = len(self.tracks)
+        self.tracks.extend(paths)
+        return first
+
+    def next_index(self):
+        """ Index of the track after the current one, None at the end of the session """
+        return self.index + 1 if self.index + 1 < len(self.tracks) else None
+
+    def previous_index(self):
+        """ Index of the track before the current one, None at the start of the session """
+        return self.index - 1 if self.index > 0 else None
+
+    def key(self, path):
+        """ Store key of a track, its fingerprint or its basename when it cannot be read """
+        try:
+            return self.identity.key(path)
+        except OSError:
+            return track_name(path)
+
+    def stored_rows(self, path, key):
+        """ Stored effects of a track, None when it has no encoding yet """
+        rows = self.store.get(key)
+        if rows is None and key != track_name(path):
+            rows = self.store.get(track_name(path))  # Encoded before tracks were fingerprinted
+        return rows
+
+    def legacy_key(self, path, key):
+        """ Basename key the stored effects of a track come from, None when they are stored under `key` """
+        name = track_name(path)
+        if name == key or self.store.get(key) is not None or self.store.get(name) is None:
+            return None
+        return name
+
+    def select(self, index):
+        """ Make track `index` current, returns its store key, media, timeline and stored rows """
+        self.index = index
+        path = self.tracks[index]
+        key = self.key(path)
+        rows = self.stored_rows(path, key)
+        with self.lock:
+            prepared = self.prepared.get(path)
+            if prepared is not None:
+                self.prepared.move_to_end(path)
+        if prepared is None:
+            prepared = self.remember(PreparedTrack(path, self.create_media(path), rows, None))  # Not prefetched
+        timeline, prepared.timeline = prepared.timeline, None
+        if timeline is None or rows != prepared.rows:
+            timeline = EffectTimeline.from_rows(rows or [])  # Taken before or stored effects changed since
+        self.schedule()
+        return key, prepared.media, timeline, rows
+
+    def schedule(self):
+        """ Queue the tracks after the current one that are not prepared yet """
+        for path in self.tracks[self.index + 1:self.index + 1 + self.prefetch]:
+            with self.lock:
+                if path in self.prepared or path in self.queued:
+                    continue
+                self.queued.add(path)
+            self.pending.put((path, self.stored_rows(path, self.key(path))))
+
+    def create_media(self, path, *options):
+        """ Unparsed media of `path` with its title and author, cheap enough for the GUI thread """
+        import vlc
+        media = self.instance.media_new(path, *options)
+        media.set_meta(vlc.Meta.Title, track_name(path))
+        media.set_meta(vlc.Meta.Artist, 'Local Media')  # Default author value for local media
+        return media
+
+    def prepare(self, path, rows):
+        """ Create and parse the media of `path` and build its timeline, on the worker thread """
+        import vlc
+        media = self.create_media(path)
+        media.parse_with_options(vlc.MediaParseFlag.local, PARSE_TIMEOUT_MS)
+        deadline = time.monotonic() + PARSE_TIMEOUT_MS / 1000
+        while media.get_parsed_status() == 0 and time.monotonic() < deadline:
+            time.sleep(0.005)
+        return PreparedTrack(path, media, rows, EffectTimeline.from_rows(rows or []))
+
+    def remember(self, prepared):
+        """ Keep a prepared track, releasing the least recently used beyond capacity.
+            Returns the track that is kept for its path. """
+        with self.lock:
+            kept = self.prepared.get(prepared.path)
+            if kept is not None:
+                prepared.media.release()  # Prepared twice, the first one may already be playing
+                return kept
+            self.prepared[prepared.path] = prepared
+            while len(self.prepared) > self.capacity:
+                _, evicted = self.prepared.popitem(last=False)
+                evicted.media.release()
+            return prepared
+
+    def run(self):
+        """ Worker thread, prepares queued tracks until the session is closed """
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            path, rows = item
+            try:
+                prepared = self.prepare(path, rows)
+            except Exception:
+                prepared = None  # Handed over unparsed when the track is selected
+            if prepared is not None:
+                self.remember(prepared)
+            with self.lock:
+                self.queued.discard(path)
+
+    def close(self):
+        self.pending.put(None)
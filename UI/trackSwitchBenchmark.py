@@ -0,0 +1,73 @@
+"""
+    Track switch latency benchmark for TrackSession
+
+    Steps through the tracks of a directory the way the skip next button does and
+    measures the time from asking for the next track until VLC reports that it is
+    playing, once without prefetching and once with the default prefetch depth.
+
+    Usage: python trackSwitchBenchmark.py [media_directory] [seconds_per_track]
+"""
+import sys
+import time
+import json
+import statistics
+import threading
+
+import vlc
+
+from batchEncoder import find_media
+from trackIdentity import TrackIdentity
+from trackSession import PREFETCH, TrackSession
+from vlcInstance import get_instance
+
+
+def measure(tracks, prefetch, seconds):
+    """ Milliseconds from select() until MediaPlayerPlaying for every track after the first """
+    instance = get_instance()
+    player = instance.media_player_new()
+    player.audio_set_mute(True)
+    playing = threading.Event()
+    player.event_manager().event_attach(vlc.EventType.MediaPlayerPlaying, lambda event: playing.set())
+
+    session = TrackSession(instance, {}, TrackIdentity(), prefetch=prefetch)  # No stored encodings, only media
+    session.add(tracks)
+    latencies = []
+    for index in range(len(tracks)):
+        playing.clear()
+        start = time.perf_counter()
+        _, media, _, _ = session.select(index)
+        player.set_media(media)
+        player.play()
+        playing.wait(5)
+        if index > 0:
+            latencies.append((time.perf_counter() - start) * 1000)
+        time.sleep(seconds)  # Time for the worker to prefetch, as an operator would spend on a track
+    player.stop()
+    session.close()
+    return latencies
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python trackSwitchBenchmark.py [media_directory] [seconds_per_track]")
+        sys.exit(1)
+
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    tracks = sorted(path for paths in find_media(sys.argv[1]).values() for path in paths)
+    if len(tracks) < 2:
+        print('Need at least two tracks to switch between')
+        sys.exit(1)
+
+    results = {}
+    for mode, prefetch in (('cold', 0), ('prefetched', PREFETCH)):
+        latencies = measure(tracks, prefetch, seconds)
+        results[mode] = {'median_ms': statistics.median(latencies), 'max_ms': max(latencies)}
+
+    print('{:<12}{:>12}{:>10}'.format('switch', 'median (ms)', 'max (ms)'))
+    for mode, result in results.items():
+        print('{:<12}{:>12.1f}{:>10.1f}'.format(mode, result['median_ms'], result['max_ms']))
+    print(json.dumps({'tracks': len(tracks), 'seconds_per_track': seconds, 'latency': results}))
+
+
+if __name__ == '__main__':
+    main()
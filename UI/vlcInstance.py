@@ -0,0 +1,105 @@
+"""
+    Shared audio-only VLC instance
+
+    Creating a vlc.Instance loads and probes VLC's plugins, which is slow and
+    costs memory, and a default instance also sets up video outputs, subtitle
+    renderers and the title overlay that an audio-only encoder never uses.
+    get_instance() creates one instance per process, configured for audio only
+    with tuned caching, and hands the same instance to every player window and
+    headless worker in that process.
+
+    Run directly to compare init time and resident memory of a default instance
+    with the shared one, each in a fresh process.
+
+    Usage: python vlcInstance.py [runs]
+"""
+import os
+import subprocess
+import sys
+import threading
+import time
+import json
+import statistics
+
+FILE_CACHING_MS = 300  # Local files need little read-ahead, VLC's default is 1000 ms
+NETWORK_CACHING_MS = 1500  # Streams get more than the 1000 ms default to ride out slow resolvers
+
+AUDIO_ARGS = ['--intf=dummy', '--quiet', '--no-video', '--no-video-title-show', '--no-spu', '--no-osd',
+              '--no-sub-autodetect-file', '--no-stats', '--no-lua',
+              '--file-caching={}'.format(FILE_CACHING_MS), '--network-caching={}'.format(NETWORK_CACHING_MS)]
+
+_instance = None
+_instance_pid = None  # A forked worker must not reuse its parent's instance
+_lock = threading.Lock()
+
+
+def get_instance():
+    """ The audio-only VLC instance of this process, created on first use """
+    global _instance, _instance_pid
+    with _lock:
+        if _instance is None or _instance_pid != os.getpid():
+            import vlc  # Slow to import, only paid by processes that play or probe media
+            _instance = vlc.Instance(AUDIO_ARGS)
+            _instance_pid = os.getpid()
+        return _instance
+
+
+def resident_kb():
+    """ Resident set size of this process in kB, None where it cannot be read """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak  # Peak, not current, but close after init
+
+
+def measure(mode):
+    """ Init time and resident memory of one instance created in this process """
+    import vlc
+    before = resident_kb()
+    start = time.perf_counter()
+    instance = vlc.Instance() if mode == 'default' else get_instance()
+    instance.media_player_new()  # Include the player, which loads the output modules
+    init_ms = (time.perf_counter() - start) * 1000
+    after = resident_kb()
+    start = time.perf_counter()
+    if mode == 'shared':
+        get_instance().media_player_new()  # A second window reuses the instance
+    second_ms = (time.perf_counter() - start) * 1000 if mode == 'shared' else init_ms
+    return {'init_ms': init_ms, 'second_player_ms': second_ms, 'rss_before_kb': before, 'rss_after_kb': after}
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '--measure':
+        print(json.dumps(measure(sys.argv[2])))
+        return
+
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    results = {}
+    for mode in ('default', 'shared'):
+        samples = []
+        for _ in range(runs):
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), '--measure', mode],
+                                    capture_output=True, text=True, check=True).stdout
+            samples.append(json.loads(output.splitlines()[-1]))
+        results[mode] = {key: statistics.median(sample[key] for sample in samples) if samples[0][key] is not None
+                         else None for key in samples[0]}
+
+    print('{:<10}{:>12}{:>20}{:>16}{:>16}'.format('instance', 'init (ms)', 'second player (ms)',
+                                                  'rss before (kB)', 'rss after (kB)'))
+    for mode, result in results.items():
+        print('{:<10}{:>12.1f}{:>20.1f}{:>16}{:>16}'.format(mode, result['init_ms'], result['second_player_ms'],
+                                                          result['rss_before_kb'], result['rss_after_kb']))
+    print(json.dumps({'runs': runs, 'median': results}))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,28 +1,99 @@
 import time
 import os
 import sys
+import tempfile
+import threading
 import subprocess
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 
+from hotReload import SNAPSHOT_COMMAND, STATE_ENV
+
+DEBOUNCE_S = 0.5  # Editors fire several events per save, restart once they have been quiet this long
+HANDOFF_TIMEOUT_S = 5  # Time the old process gets to write its session and exit before it is killed
+IGNORED_DIRS = ('__pycache__', 'build', 'dist', '.git')
+
+
 class ChangeHandler(FileSystemEventHandler):
-    def __init__(self, script_path, python_interpreter):
+    """ Restarts the script when any module next to it changes, handing its session to the new process """
+
+    def __init__(self, script_path, python_interpreter, debounce_s=DEBOUNCE_S):
         self.script_path = os.path.abspath(script_path)
+        self.directory = os.path.dirname(self.script_path)
         self.python_interpreter = python_interpreter
+        self.debounce_s = debounce_s
+        self.state_path = os.path.join(tempfile.gettempdir(), 'hotReload-{}.json'.format(os.getpid()))
+        self.timer = None
+        self.changed = set()  # Modules changed since the last restart
+        self.lock = threading.Lock()  # Guards `timer` and `changed`, events arrive on the observer thread
+        self.restart_lock = threading.Lock()
         self.process = None
         self.start_process()
 
     def start_process(self):
-        if self.process:
+        env = dict(os.environ, **{STATE_ENV: self.state_path})
+        self.process = subprocess.Popen([self.python_interpreter, self.script_path], env=env,
+                                        stdin=subprocess.PIPE, text=True)
+
+    def stop_process(self):
+        """ Ask the running process for a snapshot of its session and wait for it to exit """
+        if self.process is None or self.process.poll() is not None:
+            return  # Nothing to snapshot, a state file left by a failed start is kept for the next one
+        try:
+            os.remove(self.state_path)  # Stale, the running process writes a newer one
+        except FileNotFoundError:
+            pass
+        try:
+            self.process.stdin.write(SNAPSHOT_COMMAND + '\n')
+            self.process.stdin.flush()
+            self.process.wait(HANDOFF_TIMEOUT_S)
+        except (OSError, subprocess.TimeoutExpired):
+            print("No session handoff, killing the process")
             self.process.kill()
             self.process.wait()
-        self.process = subprocess.Popen([self.python_interpreter, self.script_path])
 
-    def on_modified(self, event):
-        if os.path.abspath(event.src_path) == self.script_path:
-            print("Detected change in script, restarting...")
+    def restart(self):
+        with self.lock:
+            changed, self.changed, self.timer = sorted(self.changed), set(), None
+        with self.restart_lock:
+            print("Detected change in {}, restarting...".format(', '.join(changed)))
+            self.stop_process()
             self.start_process()
 
+    def is_module(self, path):
+        path = os.path.abspath(path)
+        parts = os.path.relpath(path, self.directory).split(os.sep)
+        return path.endswith('.py') and not any(part in IGNORED_DIRS for part in parts)
+
+    def on_any_event(self, event):
+        if event.is_directory or event.event_type not in ('modified', 'created', 'moved'):
+            return
+        # Editors that save through a temp file show up as a move onto the module
+        path = getattr(event, 'dest_path', None) or event.src_path
+        if not self.is_module(path):
+            return
+        with self.lock:
+            self.changed.add(os.path.relpath(os.path.abspath(path), self.directory))
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = threading.Timer(self.debounce_s, self.restart)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def close(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+        with self.restart_lock:
+            if self.process and self.process.poll() is None:
+                self.process.kill()
+                self.process.wait()
+        try:
+            os.remove(self.state_path)
+        except FileNotFoundError:
+            pass
+
+
 if __name__ == "__main__":
     if len(sys.argv) != 3:
         print("Usage: python watchDog.py [python_interpreter] [script_path]")
@@ -33,7 +104,7 @@ if __name__ == "__main__":
 
     observer = Observer()
     event_handler = ChangeHandler(script_path, python_interpreter)
-    observer.schedule(event_handler, os.path.dirname(script_path), recursive=False)
+    observer.schedule(event_handler, event_handler.directory, recursive=True)  # Every module of the app
     observer.start()
 
     try:
@@ -41,7 +112,6 @@ if __name__ == "__main__":
             time.sleep(1)
     except KeyboardInterrupt:
         observer.stop()
-        if event_handler.process:
-            event_handler.process.kill()
+        event_handler.close()
 
     observer.join()
@@ -0,0 +1,138 @@
+"""
+    Multi-resolution waveform peaks with an on-disk cache
+
+    A track is decoded once and reduced to min/max pairs per PEAK_BIN samples.
+    Coarser levels are built by folding four bins into one until a level fits in
+    MIN_LEVEL_BINS. The pyramid is stored as a small binary file in Peaks/ next to
+    the encoding data, named by the fingerprint of the audio file, and later opened
+    through a memory map so reopening a track costs no decoding at all.
+
+    File layout (little endian):
+        header  '<4sHIIH'  magic, version, sample rate, samples per level 0 bin, levels
+        levels  '<QQ'      byte offset and bin count of every level, finest first
+        data    int16      (bins, 2) min/max pairs of every level
+"""
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+from audioDecode import DECODE_RATE, decode_blocks
+from trackIdentity import fingerprint
+
+PEAK_BIN = 64  # Decoded samples per level 0 bin (8 ms at DECODE_RATE)
+FOLD = 4  # Level n+1 bins per level n bin
+MIN_LEVEL_BINS = 256  # Stop folding once a level is this small
+CACHE_DIRNAME = 'Peaks'
+
+MAGIC = b'PEAK'
+VERSION = 1
+HEADER = struct.Struct('<4sHIIH')
+LEVEL = struct.Struct('<QQ')
+
+
+class PeakPyramid:
+    """ Min/max peak levels of one track, level 0 is the finest """
+
+    def __init__(self, levels, sample_rate=DECODE_RATE, bin_samples=PEAK_BIN):
+        self.levels = levels  # int16 arrays of shape (bins, 2)
+        self.sample_rate = sample_rate
+        self.bin_samples = bin_samples
+
+    @property
+    def duration_ms(self):
+        return len(self.levels[0]) * self.bin_samples * 1000 // self.sample_rate
+
+    def columns(self, width):
+        """ (mins, maxs) as floats in [-1, 1] for `width` pixel columns over the whole track """
+        level = next((level for level in reversed(self.levels) if len(level) >= width), self.levels[0])
+        if not len(level):
+            return np.zeros(width), np.zeros(width)
+        starts = np.linspace(0, len(level), width, endpoint=False).astype(np.int64)
+        mins = np.minimum.reduceat(level[:, 0], starts) / 32768.0
+        maxs = np.maximum.reduceat(level[:, 1], starts) / 32768.0
+        return mins, maxs
+
+
+def compute_peaks(path, sample_rate=DECODE_RATE, bin_samples=PEAK_BIN):
+    """ Decode `path` block by block and build its peak pyramid """
+    mins, maxs = [], []
+    carry = np.empty(0, dtype=np.int16)
+    for block in decode_blocks(path, sample_rate):
+        samples = np.concatenate((carry, block))
+        usable = len(samples) // bin_samples * bin_samples
+        bins = samples[:usable].reshape(-1, bin_samples)
+        mins.append(bins.min(axis=1))
+        maxs.append(bins.max(axis=1))
+        carry = samples[usable:]
+    if len(carry):
+        mins.append(np.array([carry.min()], dtype=np.int16))
+        maxs.append(np.array([carry.max()], dtype=np.int16))
+
+    level = np.empty((0, 2), dtype=np.int16)
+    if mins:
+        level = np.stack((np.concatenate(mins), np.concatenate(maxs)), axis=1).astype(np.int16)
+    levels = [level]
+    while len(levels[-1]) > MIN_LEVEL_BINS:
+        levels.append(fold(levels[-1]))
+    return PeakPyramid(levels, sample_rate, bin_samples)
+
+
+def fold(level):
+    """ Merge every FOLD bins of a level into one """
+    pad = -len(level) % FOLD
+    if pad:
+        level = np.concatenate((level, np.repeat(level[-1:], pad, axis=0)))
+    groups = level.reshape(-1, FOLD, 2)
+    return np.stack((groups[:, :, 0].min(axis=1), groups[:, :, 1].max(axis=1)), axis=1)
+
+
+def save_peaks(pyramid, cache_path):
+    """ Write the pyramid to `cache_path` through a temporary file """
+    offset = HEADER.size + LEVEL.size * len(pyramid.levels)
+    table = []
+    for level in pyramid.levels:
+        table.append(LEVEL.pack(offset, len(level)))
+        offset += level.nbytes
+    directory = os.path.dirname(os.path.abspath(cache_path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, VERSION, pyramid.sample_rate, pyramid.bin_samples, len(pyramid.levels)))
+            file.write(b''.join(table))
+            for level in pyramid.levels:
+                file.write(level.astype('<i2').tobytes())
+        os.replace(temp_path, cache_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def load_peaks(cache_path):
+    """ Open a cached pyramid as memory mapped views, None if the file is missing, stale or corrupt """
+    try:
+        with open(cache_path, 'rb') as file:
+            magic, version, sample_rate, bin_samples, count = HEADER.unpack(file.read(HEADER.size))
+            table = [LEVEL.unpack(file.read(LEVEL.size)) for _ in range(count)]
+    except (FileNotFoundError, struct.error):
+        return None
+    if magic != MAGIC or version != VERSION:
+        return None
+    try:
+        data = np.memmap(cache_path, dtype='<i2', mode='r')
+        levels = [data[offset // 2:offset // 2 + bins * 2].reshape(bins, 2) for offset, bins in table]
+    except ValueError:  # Truncated or corrupt, the caller recomputes and overwrites it
+        return None
+    return PeakPyramid(levels, sample_rate, bin_samples)
+
+
+def cached_peaks(path, cache_dir):
+    """ Peaks of `path` from the cache in `cache_dir`, computing and storing them on a miss """
+    cache_path = os.path.join(cache_dir, fingerprint(path) + '.peaks')
+    pyramid = load_peaks(cache_path)
+    if pyramid is None:
+        save_peaks(compute_peaks(path), cache_path)
+        pyramid = load_peaks(cache_path)
+    return pyramid